@@ -4,4 +4,7 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'querySafe.settings')
 
+# Serve through ASGI (e.g. gunicorn -k uvicorn.workers.UvicornWorker querySafe.asgi:application)
+# so the training progress stream (chatbot_status_stream, Server-Sent Events) runs on the
+# event loop instead of holding a worker per open dashboard.
 application = get_asgi_application()
@@ -1,8 +1,8 @@
 import os
 from celery import Celery
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'querySafe v0.1.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'querySafe.settings')
 
 app = Celery('querySafe')
 app.config_from_object('django.conf:settings', namespace='CELERY')
-app.autodiscover_tasks()
\ No newline at end of file
+app.autodiscover_tasks()
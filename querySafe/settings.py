@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,13 +26,151 @@ WEBSITE_URL = os.getenv('WEBSITE_URL')
 PROJECT_ID = "metricvibes-1718777660306"
 REGION = "us-central1"
 
-# Paths for FAISS indices and metadata
+# Per-chatbot artifact folders: index, chunk store, manifest and per-document captions
+PIPELINE_ARTIFACT_ROOT = os.getenv('PIPELINE_ARTIFACT_ROOT', os.path.join(BASE_DIR, "documents", "chatbots"))
+
+# Flat folders of FAISS indices and metadata used before the per-chatbot layout;
+# a chatbot's files are moved out of them on first use
 INDEX_DIR = os.path.join(BASE_DIR, "documents", "vector_index")
 META_DIR = os.path.join(BASE_DIR, "documents", "chunk-metadata")
 
-# Create directories if they don't exist
-os.makedirs(INDEX_DIR, exist_ok=True)
-os.makedirs(META_DIR, exist_ok=True)
+# Training pipeline settings
+# Number of worker processes used to rasterize PDF pages (Step 1)
+PIPELINE_RASTER_WORKERS = int(os.getenv('PIPELINE_RASTER_WORKERS', min(4, os.cpu_count() or 1)))
+# Pages handed to a worker at a time; large PDFs are split into ranges of this size
+PIPELINE_RASTER_PAGES_PER_TASK = int(os.getenv('PIPELINE_RASTER_PAGES_PER_TASK', 8))
+# Page rendering: resolution adapts to the smallest text on the page, within these limits
+PIPELINE_RENDER_MIN_DPI = int(os.getenv('PIPELINE_RENDER_MIN_DPI', 72))
+PIPELINE_RENDER_MAX_DPI = int(os.getenv('PIPELINE_RENDER_MAX_DPI', 200))
+# Pixel budget per rendered page (width x height), caps the resolution of large pages
+PIPELINE_RENDER_MAX_PIXELS = int(os.getenv('PIPELINE_RENDER_MAX_PIXELS', 2000000))
+# Target height in pixels of the smallest text on a page
+PIPELINE_RENDER_MIN_GLYPH_PX = int(os.getenv('PIPELINE_RENDER_MIN_GLYPH_PX', 20))
+# Image format sent to Gemini: png, jpeg or webp
+PIPELINE_RENDER_IMAGE_FORMAT = os.getenv('PIPELINE_RENDER_IMAGE_FORMAT', 'jpeg')
+# JPEG/WebP quality (1-100)
+PIPELINE_RENDER_QUALITY = int(os.getenv('PIPELINE_RENDER_QUALITY', 80))
+PIPELINE_RENDER_GRAYSCALE = os.getenv('PIPELINE_RENDER_GRAYSCALE', 'False') == 'True'
+# Debug: also write every rendered page / text page to the chatbot's pages/ folder
+PIPELINE_KEEP_PAGE_IMAGES = os.getenv('PIPELINE_KEEP_PAGE_IMAGES', 'False') == 'True'
+# Page triage: pages with a usable text layer are read natively instead of captioned by Gemini
+PIPELINE_TRIAGE_ENABLED = os.getenv('PIPELINE_TRIAGE_ENABLED', 'True') == 'True'
+# Fewer non-whitespace characters than this means the page is a scan or mostly visual
+PIPELINE_TRIAGE_MIN_TEXT_CHARS = int(os.getenv('PIPELINE_TRIAGE_MIN_TEXT_CHARS', 200))
+# Share of the page covered by images or vector drawings above which it is captioned
+PIPELINE_TRIAGE_MAX_VISUAL_COVERAGE = float(os.getenv('PIPELINE_TRIAGE_MAX_VISUAL_COVERAGE', 0.3))
+# More vector paths than this usually means a chart or a ruled table
+PIPELINE_TRIAGE_MAX_DRAWINGS = int(os.getenv('PIPELINE_TRIAGE_MAX_DRAWINGS', 25))
+# Maximum number of Gemini caption requests in flight at once (Step 2)
+PIPELINE_CAPTION_CONCURRENCY = int(os.getenv('PIPELINE_CAPTION_CONCURRENCY', 8))
+# Caption requests per minute allowed by our Vertex AI quota (0 disables the limiter)
+PIPELINE_CAPTION_RPM = int(os.getenv('PIPELINE_CAPTION_RPM', 200))
+# Requests that may be sent back-to-back before the limiter kicks in
+PIPELINE_CAPTION_BURST = int(os.getenv('PIPELINE_CAPTION_BURST', 10))
+# Persistent caption cache keyed by page image hash, so re-uploaded pages skip Gemini
+PIPELINE_CAPTION_CACHE_DIR = os.getenv('PIPELINE_CAPTION_CACHE_DIR', os.path.join(BASE_DIR, "documents", "caption_cache"))
+# Size limit of the caption cache; least recently used captions are evicted (0 disables the cache)
+PIPELINE_CAPTION_CACHE_MAX_MB = int(os.getenv('PIPELINE_CAPTION_CACHE_MAX_MB', 256))
+# Chunk size in tokens of the embedding model's tokenizer (0: the model's sequence limit, 254 for all-MiniLM-L6-v2)
+PIPELINE_CHUNK_MAX_TOKENS = int(os.getenv('PIPELINE_CHUNK_MAX_TOKENS', 0))
+# Tokens shared by consecutive chunks
+PIPELINE_CHUNK_OVERLAP_TOKENS = int(os.getenv('PIPELINE_CHUNK_OVERLAP_TOKENS', 32))
+# Compress every chunk in the chunk store with zstd (read back chunk by chunk, so top-k stays cheap)
+PIPELINE_CHUNK_COMPRESSION = os.getenv('PIPELINE_CHUNK_COMPRESSION', 'True') == 'True'
+# Capacity of the in-memory queues between pipeline stages (pages / documents waiting)
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', 32))
+# Attempts of a failed training job before its documents are marked failed
+PIPELINE_MAX_RETRIES = int(os.getenv('PIPELINE_MAX_RETRIES', 3))
+# Upper bound for one training run (broker visibility timeout, stale running jobs are requeued after it)
+PIPELINE_LOCK_TIMEOUT = int(os.getenv('PIPELINE_LOCK_TIMEOUT', 6 * 60 * 60))
+# Per-chatbot run lock lifetime; a live run refreshes it, so a killed worker's lock expires after this many seconds
+PIPELINE_LOCK_TTL = int(os.getenv('PIPELINE_LOCK_TTL', 120))
+# Longest wait before a failed run is retried; a running job without a heartbeat for
+# 3 * PIPELINE_LOCK_TTL plus this long lost its worker and is requeued
+PIPELINE_RETRY_BACKOFF_MAX = int(os.getenv('PIPELINE_RETRY_BACKOFF_MAX', 600))
+# Training runs executing at once across all customers (keep CELERY_WORKER_CONCURRENCY at least this high)
+PIPELINE_GLOBAL_WORKERS = int(os.getenv('PIPELINE_GLOBAL_WORKERS', 2))
+# Slots a single user may hold while others wait, so one huge upload cannot starve the rest
+PIPELINE_MAX_JOBS_PER_TENANT = int(os.getenv('PIPELINE_MAX_JOBS_PER_TENANT', 1))
+# A waiting job moves up one priority lane per this many minutes (0 = strict plan priority)
+PIPELINE_PRIORITY_AGING_MINUTES = int(os.getenv('PIPELINE_PRIORITY_AGING_MINUTES', 30))
+
+# Embedding engine (all-MiniLM-L6-v2) used by the pipeline and the chat endpoint
+# Backend: torch (fp32), torch-int8 (dynamic quantization) or onnx (ONNX Runtime)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+# Optional ONNX file inside the model repo for the onnx backend, e.g. onnx/model_qint8_avx512.onnx
+EMBEDDING_ONNX_FILE = os.getenv('EMBEDDING_ONNX_FILE') or None
+# Texts per forward pass; texts are length-sorted first to keep padding low
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+# Per-worker cache of loaded chatbot indexes and chunk stores (by file size, least recently used evicted; 0 disables)
+CHAT_INDEX_CACHE_MAX_MB = int(os.getenv('CHAT_INDEX_CACHE_MAX_MB', 256))
+# Search chat indexes from a read-only memory map (pages shared by all workers) instead of reading them into each worker
+CHAT_INDEX_MMAP = os.getenv('CHAT_INDEX_MMAP', 'True') == 'True'
+# Cache of chat query embeddings: 'local' (LRU per worker) or 'django' (the default cache, shared through Redis)
+QUERY_EMBEDDING_CACHE = os.getenv('QUERY_EMBEDDING_CACHE', 'local')
+# Vectors kept by the local cache (about 1.5 KB each; 0 disables it)
+QUERY_EMBEDDING_CACHE_ENTRIES = int(os.getenv('QUERY_EMBEDDING_CACHE_ENTRIES', 10000))
+# Seconds a vector stays in the django cache
+QUERY_EMBEDDING_CACHE_TIMEOUT = int(os.getenv('QUERY_EMBEDDING_CACHE_TIMEOUT', 7 * 24 * 3600))
+# Reuse the answer to an earlier first question of a chatbot when the new one is this similar (cosine) and retrieves the same chunks
+CHAT_ANSWER_CACHE_THRESHOLD = float(os.getenv('CHAT_ANSWER_CACHE_THRESHOLD', 0.95))
+# Seconds a cached answer is reused; answers are also dropped when the chatbot is retrained
+CHAT_ANSWER_CACHE_TTL = int(os.getenv('CHAT_ANSWER_CACHE_TTL', 6 * 3600))
+# Answers kept per chatbot (0 disables the cache), and chatbots kept per worker
+CHAT_ANSWER_CACHE_ENTRIES = int(os.getenv('CHAT_ANSWER_CACHE_ENTRIES', 32))
+CHAT_ANSWER_CACHE_CHATBOTS = int(os.getenv('CHAT_ANSWER_CACHE_CHATBOTS', 256))
+# Unix socket of the embedding service (manage.py embedding_service); empty: every process loads the model itself
+EMBEDDING_SERVICE_SOCKET = os.getenv('EMBEDDING_SERVICE_SOCKET', '')
+# Intra-op threads of the embedding service; the rest of the cores stay with the web workers
+EMBEDDING_SERVICE_THREADS = int(os.getenv('EMBEDDING_SERVICE_THREADS', max(1, (os.cpu_count() or 2) // 2)))
+# How long the service waits for more requests to share a forward pass (milliseconds)
+EMBEDDING_SERVICE_BATCH_WAIT_MS = float(os.getenv('EMBEDDING_SERVICE_BATCH_WAIT_MS', 2))
+# Seconds a worker waits for an answer of the embedding service
+EMBEDDING_SERVICE_TIMEOUT = float(os.getenv('EMBEDDING_SERVICE_TIMEOUT', 30))
+
+# Training progress shown on the dashboard (kept in the cache, use Redis so the worker and web share it)
+# Seconds a progress entry is kept, and minimum seconds between two progress updates of a run
+PIPELINE_PROGRESS_TIMEOUT = int(os.getenv('PIPELINE_PROGRESS_TIMEOUT', 86400))
+PIPELINE_PROGRESS_INTERVAL = float(os.getenv('PIPELINE_PROGRESS_INTERVAL', 1.0))
+# Seconds between status version checks of the event stream and long polls
+CHATBOT_STATUS_CHECK_INTERVAL = float(os.getenv('CHATBOT_STATUS_CHECK_INTERVAL', 1.0))
+# Longest ?wait= a polling client may ask for, and lifetime of one event stream before the browser reconnects
+CHATBOT_STATUS_LONG_POLL_SECONDS = int(os.getenv('CHATBOT_STATUS_LONG_POLL_SECONDS', 25))
+CHATBOT_STATUS_STREAM_SECONDS = int(os.getenv('CHATBOT_STATUS_STREAM_SECONDS', 300))
+
+# Celery (training pipeline jobs)
+# Start a worker with: celery -A querySafe worker -l info
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://localhost:6379/0')
+# Run jobs inline instead of on a worker (local development); use 'memory://' as broker then
+CELERY_TASK_ALWAYS_EAGER = os.getenv('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_ACKS_LATE = True
+# Re-queue jobs whose worker was killed (deploys, OOM) instead of dropping them
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Threads, because the rasterizer starts its own process pool and prefork children may not have children
+CELERY_WORKER_POOL = os.getenv('CELERY_WORKER_POOL', 'threads')
+# Number of chatbots trained at the same time per worker
+CELERY_WORKER_CONCURRENCY = int(os.getenv('CELERY_WORKER_CONCURRENCY', 2))
+# Unacknowledged jobs are redelivered after this long, so it must exceed the longest training run
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': PIPELINE_LOCK_TIMEOUT}
+
+# Cache shared by web and Celery workers (pipeline locks, training status and progress);
+# defaults to the Redis broker. Per-process memory only works when jobs run inline.
+REDIS_URL = os.getenv('REDIS_URL')
+if not REDIS_URL and CELERY_BROKER_URL.startswith(('redis://', 'rediss://')):
+    REDIS_URL = CELERY_BROKER_URL
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif not CELERY_TASK_ALWAYS_EAGER:
+    raise ImproperlyConfigured(
+        "Set REDIS_URL: the Celery worker reports training status and progress through the cache, "
+        "which a per-process memory cache cannot share with the web workers."
+    )
 
 # Email Settings
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
@@ -129,5 +268,11 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Fingerprint uploads while they stream in (used to skip re-uploaded documents)
+FILE_UPLOAD_HANDLERS = [
+    'user_querySafe.upload_handlers.HashingMemoryFileUploadHandler',
+    'user_querySafe.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
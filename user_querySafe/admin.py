@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import User, Chatbot, ChatbotDocument, Conversation, Message, Contact, ActivationCode, SubscriptionPlan, UserPlanAlot, HelpSupportRequest
+from .chatbot.progress import bump_status_version
+from .chatbot.storage import delete_chatbot_artifacts
+from .models import User, Chatbot, ChatbotDocument, PipelineJob, PipelineRun, PipelineStage, Conversation, Message, Contact, ActivationCode, SubscriptionPlan, UserPlanAlot, HelpSupportRequest
 
 @admin.register(ActivationCode)
 class ActivationCodeAdmin(admin.ModelAdmin):
@@ -65,12 +67,86 @@ class ChatbotAdmin(admin.ModelAdmin):
         )
     status_badge.short_description = 'Status'
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Let the owner's dashboard pick up status changes made here
+        bump_status_version(obj.user.user_id)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        # Index, chunks and checkpoints are only reachable through the chatbot
+        delete_chatbot_artifacts(obj.chatbot_id)
+
+    def delete_queryset(self, request, queryset):
+        chatbot_ids = list(queryset.values_list('chatbot_id', flat=True))
+        super().delete_queryset(request, queryset)
+        for chatbot_id in chatbot_ids:
+            delete_chatbot_artifacts(chatbot_id)
+
+@admin.register(PipelineJob)
+class PipelineJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chatbot', 'user', 'priority', 'status', 'enqueued_at', 'started_at', 'wait_time_display', 'heartbeat_at', 'finished_at')
+    list_filter = ('status', 'priority', 'enqueued_at')
+    search_fields = ('chatbot__chatbot_id', 'user__user_id', 'user__email')
+    readonly_fields = ('chatbot', 'user', 'enqueued_at', 'started_at', 'heartbeat_at', 'finished_at')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('chatbot', 'user')
+
+    def has_add_permission(self, request):
+        return False
+
+    def wait_time_display(self, obj):
+        return f"{obj.wait_time:.0f}s" if obj.wait_time is not None else '-'
+    wait_time_display.short_description = 'Wait'
+
+class PipelineStageInline(admin.TabularInline):
+    model = PipelineStage
+    extra = 0
+    can_delete = False
+    fields = ('name', 'wall_time', 'busy_time', 'pages', 'chunks', 'vectors', 'bytes_read', 'bytes_written',
+              'api_calls', 'latency_p50', 'latency_p95', 'latency_p99', 'failures')
+    readonly_fields = fields
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(PipelineRun)
+class PipelineRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'chatbot', 'status', 'started_at', 'wall_time_display', 'documents', 'pages',
+                    'chunks', 'vectors', 'pages_per_second')
+    list_filter = ('status', 'started_at')
+    search_fields = ('chatbot__chatbot_id', 'chatbot__name', 'error')
+    readonly_fields = ('chatbot', 'status', 'started_at', 'finished_at', 'wall_time', 'documents', 'pages',
+                       'chunks', 'vectors', 'error')
+    inlines = [PipelineStageInline]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('chatbot')
+
+    def has_add_permission(self, request):
+        return False
+
+    def wall_time_display(self, obj):
+        return f"{obj.wall_time:.1f}s"
+    wall_time_display.short_description = 'Wall Time'
+
+    def pages_per_second(self, obj):
+        return f"{obj.pages / obj.wall_time:.2f}" if obj.wall_time else '-'
+    pages_per_second.short_description = 'Pages/s'
+
 @admin.register(ChatbotDocument)
 class ChatbotDocumentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'chatbot', 'document_name', 'uploaded_at')
-    list_filter = ('uploaded_at', 'chatbot')
-    search_fields = ('chatbot__name', 'document')
-    readonly_fields = ('uploaded_at',)
+    list_display = ('id', 'chatbot', 'document_name', 'status', 'duplicate_of', 'uploaded_at', 'processed_at')
+    list_filter = ('status', 'uploaded_at', 'chatbot')
+    search_fields = ('chatbot__name', 'document', 'content_hash')
+    readonly_fields = ('uploaded_at', 'processed_at', 'content_hash', 'duplicate_of')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change:
+            from user_querySafe.chatbot.pipeline_processor import schedule_pipeline
+            schedule_pipeline(obj.chatbot.chatbot_id)
 
     def document_name(self, obj):
         try:
@@ -132,6 +208,7 @@ class SubscriptionPlanAdmin(admin.ModelAdmin):
         'size_limit_per_docs', 
         'pricing', 
         'status', 
+        'pipeline_priority',
         'timestamp'
     )
     search_fields = ('plan_name',)
@@ -150,6 +227,7 @@ class UserPlanAlotAdmin(admin.ModelAdmin):
         'no_of_docs', 
         'doc_size_limit', 
         'expire_date', 
+        'pipeline_priority',
         'timestamp'
     )
     search_fields = ('plan_name', 'user__user_id')
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class _Bucket:
+    """Cached answers of one chatbot, valid for one version of its index."""
+
+    def __init__(self, version):
+        self.version = version
+        self.entries = []  # (unit query vector, chunk ids, answer, stored at), oldest first
+
+
+class AnswerCache:
+    """
+    Per-chatbot cache of chat answers, so a paraphrase of an earlier question
+    is answered without calling Gemini again. A cached answer is reused when
+    the new query's embedding is within `threshold` cosine similarity of the
+    cached one and the index search returned the same chunks, i.e. the prompt
+    would carry the same knowledge. Entries expire after `ttl` seconds; a
+    chatbot's entries are dropped when its index changes (`version`, the
+    loaded index's file signature). Keeps `max_entries` answers per chatbot
+    and the `max_chatbots` most recently used chatbots.
+    """
+
+    def __init__(self, threshold, ttl, max_entries, max_chatbots):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_chatbots = max_chatbots
+        self.buckets = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype="float32").reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _bucket(self, chatbot_id, version):
+        bucket = self.buckets.get(chatbot_id)
+        if bucket is None or bucket.version != version:
+            # Retrained since these answers were cached
+            bucket = self.buckets[chatbot_id] = _Bucket(version)
+        self.buckets.move_to_end(chatbot_id)
+        while len(self.buckets) > self.max_chatbots:
+            self.buckets.popitem(last=False)
+        return bucket
+
+    def get(self, chatbot_id, version, query_vector, chunk_ids):
+        """The cached answer for this query and retrieval, or None."""
+        query = self._unit(query_vector)
+        chunk_ids = frozenset(chunk_ids)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self._bucket(chatbot_id, version)
+            bucket.entries = [entry for entry in bucket.entries if now - entry[3] < self.ttl]
+            best, best_similarity = None, self.threshold
+            for vector, ids, answer, _ in bucket.entries:
+                if ids != chunk_ids:
+                    continue
+                similarity = float(np.dot(query, vector))
+                if similarity >= best_similarity:
+                    best, best_similarity = answer, similarity
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        print(f"♻️  Answer cache hit for chatbot {chatbot_id} (cosine {best_similarity:.3f}, hit rate {self.stats()['hit_rate']})")
+        return best
+
+    def put(self, chatbot_id, version, query_vector, chunk_ids, answer):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            bucket = self._bucket(chatbot_id, version)
+            bucket.entries.append((self._unit(query_vector), frozenset(chunk_ids), answer, time.monotonic()))
+            del bucket.entries[:-self.max_entries]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "chatbots": len(self.buckets),
+            "entries": sum(len(bucket.entries) for bucket in self.buckets.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+
+CAPTION_MODEL = "gemini-2.0-flash-001"
+
+
+# ----- Helper: Build Gemini Prompt -----
+def build_prompt(image_data, mime_type="image/png"):
+    return [{
+        "role": "user",
+        "parts": [
+            {
+                "text": (
+                    "You are a visual analysis expert. Extract and describe every element in the image including:\n"
+                    "- Text (as-is)\n"
+                    "- Tables (as plain readable text)\n"
+                    "- Charts/graphs (with insights and data)\n"
+                    "- Images/diagrams (detailed description)\n"
+                    "Output must be clean, complete, and human-readable."
+                )
+            },
+            {"inline_data": {"mime_type": mime_type, "data": image_data}},
+        ]
+    }]
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens are added per second up to
+    `capacity`; acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CaptionEngine:
+    """
+    Captions page images with bounded concurrency.
+    - `concurrency` caps the number of in-flight generate_content calls
+    - `requests_per_minute` (optional) throttles calls with a token bucket so
+      we stay inside the Vertex AI quota; `burst` is the bucket size
+    - `cache` (optional CaptionCache) returns captions of previously seen
+      page images without calling Gemini or spending rate limit tokens;
+      `cache_hits` counts the ones this engine got from it
+    - `stats` (optional StageStats) records the latency of every Gemini call
+    Works with any object exposing client.models.generate_content(), including
+    StubCaptionClient for offline runs.
+    """
+
+    def __init__(self, client, concurrency=8, requests_per_minute=None, burst=None,
+                 model=CAPTION_MODEL, cache=None, stats=None):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.model = model
+        self.cache = cache
+        self.stats = stats
+        self.limiter = TokenBucket(requests_per_minute / 60.0, burst) if requests_per_minute else None
+        self.cache_hits = 0
+        self._lock = threading.Lock()
+
+    def caption(self, image_data, mime_type="image/png"):
+        key = None
+        if self.cache:
+            key = self.cache.key(image_data, self.model)
+            cached = self.cache.get(key)
+            if cached is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return cached
+        if self.limiter:
+            self.limiter.acquire()
+        start = time.perf_counter()
+        try:
+            response = self.client.models.generate_content(
+                model=self.model,
+                contents=build_prompt(image_data, mime_type)
+            )
+        finally:
+            if self.stats:
+                self.stats.record_call(time.perf_counter() - start)
+        caption = response.text.strip()
+        if self.cache:
+            self.cache.put(key, caption)
+        return caption
+
+
+# ----- Offline stand-in for genai.Client -----
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _StubModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents):
+        owner = self._owner
+        delay = owner.latency
+        if owner.jitter:
+            delay += random.uniform(0, owner.jitter)
+        if delay:
+            time.sleep(delay)
+        with owner._lock:
+            owner.calls += 1
+        size = len(contents[0]["parts"][1]["inline_data"]["data"])
+        return _StubResponse(f"Stub caption from {model} for a {size}-byte page image.")
+
+
+class StubCaptionClient:
+    """
+    Drop-in replacement for genai.Client that never touches the network.
+    Each call sleeps `latency` seconds plus up to `jitter` random seconds.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._lock = threading.Lock()
+        self.models = _StubModels(self)
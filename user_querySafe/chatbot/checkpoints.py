@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+import tempfile
+
+# Items restored from a checkpoint travel through the caption stage with this
+# mime type; their payload is the (page_label, text) saved earlier.
+CHECKPOINT_MIME_TYPE = "application/x-querysafe-checkpoint"
+
+
+class PageCheckpoints:
+    """
+    Page captions of a document that is still being trained, one small JSON
+    file per page in `directory`. Every caption is written as soon as it
+    returns, so a run that dies (crash, deploy, worker restart) resumes at the
+    first page without one instead of captioning the whole document again.
+    The files are removed once the document is indexed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def save(self, page_num, page_label, text):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file and rename it, so a checkpoint is never half-written
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"label": page_label, "text": text}, f)
+            os.replace(tmp_path, os.path.join(self.directory, f"page-{page_num}.json"))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self):
+        """Saved pages as {page_num: (page_label, text)}."""
+        if not os.path.isdir(self.directory):
+            return {}
+        pages = {}
+        for name in os.listdir(self.directory):
+            if not (name.startswith("page-") and name.endswith(".json")):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                pages[int(name[len("page-"):-len(".json")])] = (entry["label"], entry["text"])
+            except (OSError, ValueError, KeyError):
+                # An unreadable checkpoint just means the page is done again
+                continue
+        return pages
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
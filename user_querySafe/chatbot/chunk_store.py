@@ -0,0 +1,129 @@
+import json
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+import zstandard
+
+# Binary chunk store, one file per chatbot (chunks.bin, see storage.py):
+#
+#   header   magic (8 bytes) | flags (uint32) | chunk count n (uint32)
+#   offsets  uint64[n + 1], byte offsets of every chunk inside the blob
+#   blob     chunk i is blob[offsets[i]:offsets[i + 1]], UTF-8 text, or a
+#            zstd frame of it when FLAG_ZSTD is set
+#
+# The file is memory-mapped when read, so fetching chunk i touches only the
+# offsets entry and the bytes of that chunk, never the rest of the corpus.
+
+MAGIC = b"QSCHUNK1"
+HEADER = struct.Struct("<8sII")
+FLAG_ZSTD = 1
+
+
+def chunk_store_path(meta_dir, chatbot_id):
+    return os.path.join(meta_dir, f"{chatbot_id}-chunks.bin")
+
+
+def legacy_chunks_path(meta_dir, chatbot_id):
+    return os.path.join(meta_dir, f"{chatbot_id}-chunks.json")
+
+
+def write_chunk_store(path, chunks, compress=True, level=3):
+    """Write `chunks` (a list of str) to a new chunk store at `path`."""
+    compressor = zstandard.ZstdCompressor(level=level) if compress else None
+    offsets = np.zeros(len(chunks) + 1, dtype="<u8")
+    encoded = []
+    for i, chunk in enumerate(chunks):
+        data = chunk.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        encoded.append(data)
+        offsets[i + 1] = offsets[i] + len(data)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FLAG_ZSTD if compress else 0, len(chunks)))
+        f.write(offsets.tobytes())
+        for data in encoded:
+            f.write(data)
+
+
+class ChunkStore:
+    """
+    Read-only, memory-mapped view of a chunk store with O(1) access to chunk i.
+    Use as a context manager, or call close() when done. Safe to read from
+    several threads (each one gets its own decompressor).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap keeps its own handle, the file object can be closed right away
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.flags, self.count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a chunk store")
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=self.count + 1, offset=HEADER.size)
+        self._blob_start = HEADER.size + self._offsets.nbytes
+        self._local = threading.local()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(f"chunk {i} out of range (store holds {self.count})")
+        start = self._blob_start + int(self._offsets[i])
+        data = self._mmap[start:self._blob_start + int(self._offsets[i + 1])]
+        if self.flags & FLAG_ZSTD:
+            decompressor = getattr(self._local, "decompressor", None)
+            if decompressor is None:
+                decompressor = self._local.decompressor = zstandard.ZstdDecompressor()
+            data = decompressor.decompress(data)
+        return data.decode("utf-8")
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        # Drop the numpy view first, an mmap with exported buffers cannot be closed
+        self._offsets = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def ensure_chunk_store(meta_dir, chatbot_id, compress=True):
+    """
+    Path of the chatbot's chunk store, converting a chunks JSON file written
+    by earlier versions on first use. Returns None when the chatbot has neither.
+    """
+    path = chunk_store_path(meta_dir, chatbot_id)
+    if os.path.exists(path):
+        return path
+    legacy_path = legacy_chunks_path(meta_dir, chatbot_id)
+    if not os.path.exists(legacy_path):
+        return None
+    try:
+        with open(legacy_path, "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+    except FileNotFoundError:
+        # Another process converted it in the meantime
+        return path if os.path.exists(path) else None
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    write_chunk_store(tmp_path, chunks, compress=compress)
+    os.replace(tmp_path, path)
+    try:
+        os.remove(legacy_path)
+    except FileNotFoundError:
+        pass
+    print(f"  ✓ Converted {os.path.basename(legacy_path)} to a chunk store ({len(chunks)} chunks)")
+    return path
@@ -0,0 +1,87 @@
+import re
+
+# Cut quality of the gap between two tokens, best first: a paragraph break, a
+# line break, the end of a sentence, any whitespace. Tokens without a gap (word
+# pieces of one word) are never separated.
+_PARAGRAPH = re.compile(r"\n\s*\n")
+_SENTENCE_END = (".", "!", "?", ":", ";")
+
+
+class TokenChunker:
+    """
+    Splits text into chunks of at most `max_tokens` tokens of the embedding
+    model's own tokenizer, so nothing is cut off at embed time.
+
+    The text is tokenized once (a fast tokenizer returns character offsets);
+    chunks and their `overlap_tokens` overlap are sliced from those offsets, so
+    no text is tokenized twice. Each chunk ends at the best break (paragraph,
+    line, sentence, word) among its last `boundary_slack` share of tokens.
+    """
+
+    def __init__(self, tokenizer, max_tokens, overlap_tokens=32, boundary_slack=0.25):
+        if max_tokens < 2:
+            raise ValueError("max_tokens must be at least 2")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+        self.slack = max(1, int(max_tokens * boundary_slack))
+
+    @staticmethod
+    def supports(tokenizer):
+        # Offsets are only available from the Rust ("fast") tokenizers
+        return tokenizer is not None and getattr(tokenizer, "is_fast", False)
+
+    def token_offsets(self, text):
+        encoding = self.tokenizer(
+            text,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            truncation=False,
+            verbose=False,
+        )
+        # Some tokenizers report empty offsets for tokens without text
+        return [(start, end) for start, end in encoding["offset_mapping"] if end > start]
+
+    def _break_score(self, text, offsets, i):
+        """How good it is to end a chunk before token i."""
+        gap = text[offsets[i - 1][1]:offsets[i][0]]
+        if not gap:
+            return -1
+        if _PARAGRAPH.search(gap):
+            return 3
+        if "\n" in gap:
+            return 2
+        if text[offsets[i - 1][1] - 1] in _SENTENCE_END:
+            return 1
+        return 0
+
+    def _word_start(self, text, offsets, i, stop):
+        # Move i forward to the start of a word, at most to the end of the chunk
+        while i < stop and self._break_score(text, offsets, i) < 0:
+            i += 1
+        return i
+
+    def split_text(self, text):
+        offsets = self.token_offsets(text)
+        chunks = []
+        start, count = 0, len(offsets)
+        while start < count:
+            stop = min(start + self.max_tokens, count)
+            if stop < count:
+                best, best_score = stop, -1
+                for i in range(stop, max(start + 1, stop - self.slack) - 1, -1):
+                    score = self._break_score(text, offsets, i)
+                    if score > best_score:
+                        best, best_score = i, score
+                        if score == 3:
+                            break
+                stop = best
+            chunk = text[offsets[start][0]:offsets[stop - 1][1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            if stop >= count:
+                break
+            start = self._word_start(text, offsets, max(stop - self.overlap_tokens, start + 1), stop)
+        return chunks
@@ -0,0 +1,280 @@
+import copy
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+import numpy as np
+
+# ===============================================
+# EMBEDDING SERVICE
+# One sidecar process per box holds the embedding model (and its thread pool);
+# web and Celery workers send it texts over a Unix socket instead of loading
+# PyTorch themselves. Set EMBEDDING_SERVICE_SOCKET to use it, run it with
+# `python manage.py embedding_service`.
+#
+# Wire format, both directions: a length-prefixed JSON header followed by a
+# length-prefixed binary payload (empty for requests).
+#   {"op": "encode", "texts": [...]}  -> float32 rows of the embeddings
+#   {"op": "offsets", "text": "..."}  -> int32 (start, end) character offsets of its tokens
+#   {"op": "info"}                    -> model details and service counters
+# A failed request is answered with {"error": "..."}.
+
+_LENGTH = struct.Struct("!I")
+# How long a client keeps retrying to connect while the service is (re)starting
+CONNECT_RETRY_SECONDS = 5.0
+
+
+class EmbeddingServiceError(Exception):
+    pass
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("embedding service connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def send_message(sock, header, payload=b""):
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(data)) + data + _LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock):
+    header = json.loads(_recv_exact(sock, _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0]))
+    payload = _recv_exact(sock, _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))[0])
+    return header, payload
+
+
+# ----- Server -----
+class MicroBatcher:
+    """
+    Runs every encode on one thread, so requests never compete for the model's
+    thread pool. Requests arriving within `wait` seconds of each other share a
+    forward pass (up to `max_batch` texts).
+    """
+
+    def __init__(self, engine, max_batch=64, wait=0.002):
+        self.engine = engine
+        self.max_batch = max(1, max_batch)
+        self.wait = wait
+        self.queue = queue.Queue()
+        self.requests = self.texts = self.batches = 0
+        threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    def encode(self, texts):
+        slot = {"texts": texts, "done": threading.Event()}
+        self.queue.put(slot)
+        slot["done"].wait()
+        if "error" in slot:
+            raise slot["error"]
+        return slot["vectors"]
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            size = len(batch[0]["texts"])
+            deadline = time.monotonic() + self.wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    slot = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(slot)
+                size += len(slot["texts"])
+            try:
+                vectors = self.engine.encode([text for slot in batch for text in slot["texts"]])
+                start = 0
+                for slot in batch:
+                    slot["vectors"] = vectors[start:start + len(slot["texts"])]
+                    start += len(slot["texts"])
+            except Exception as e:
+                for slot in batch:
+                    slot["error"] = e
+            self.requests += len(batch)
+            self.texts += size
+            self.batches += 1
+            for slot in batch:
+                slot["done"].set()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # One connection carries many requests; the client keeps it open
+        while True:
+            try:
+                header, _ = recv_message(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                response, payload = self.server.respond(header)
+            except Exception as e:
+                response, payload = {"error": f"{type(e).__name__}: {e}"}, b""
+            send_message(self.request, response, payload)
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Every web and Celery thread reconnects at once after a restart
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, socket_path, engine, max_batch=64, wait=0.002, info=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # left over from a previous run
+        super().__init__(socket_path, _RequestHandler)
+        # Web and Celery workers usually run as another user of the same group
+        os.chmod(socket_path, 0o660)
+        self.engine = engine
+        self.batcher = MicroBatcher(engine, max_batch=max_batch, wait=wait)
+        self.info = dict(info or {})
+        # Offsets are answered from a copy of the tokenizer: encode() on the batcher thread
+        # reconfigures truncation on the model's own one, concurrent calls would collide
+        self.tokenizer = copy.deepcopy(engine.tokenizer)
+        self.tokenizer_lock = threading.Lock()
+
+    def respond(self, header):
+        op = header.get("op")
+        if op == "encode":
+            vectors = self.batcher.encode(header["texts"])
+            return {"rows": len(vectors), "dimension": self.engine.dimension}, vectors.astype("float32").tobytes()
+        if op == "offsets":
+            with self.tokenizer_lock:
+                offsets = self.tokenizer(
+                    header["text"],
+                    add_special_tokens=False,
+                    return_offsets_mapping=True,
+                    return_attention_mask=False,
+                    return_token_type_ids=False,
+                    truncation=False,
+                    verbose=False,
+                )["offset_mapping"]
+            return {"tokens": len(offsets)}, np.asarray(offsets, dtype="int32").tobytes()
+        if op == "info":
+            tokenizer = self.engine.tokenizer
+            return {
+                **self.info,
+                "dimension": self.engine.dimension,
+                "max_tokens": self.engine.max_tokens,
+                "special_tokens": tokenizer.num_special_tokens_to_add() if tokenizer is not None else 0,
+                "fast_tokenizer": bool(getattr(tokenizer, "is_fast", False)),
+                "requests": self.batcher.requests,
+                "texts": self.batcher.texts,
+                "batches": self.batcher.batches,
+            }, b""
+        raise ValueError(f"unknown op {op!r}")
+
+
+# ----- Client -----
+class RemoteTokenizer:
+    """Just enough of a Hugging Face fast tokenizer for TokenChunker, answered by the service."""
+
+    is_fast = True
+
+    def __init__(self, engine, special_tokens):
+        self.engine = engine
+        self.special_tokens = special_tokens
+
+    def __deepcopy__(self, memo):
+        # Holds no tokenizer state, the service tokenizes
+        return self
+
+    def num_special_tokens_to_add(self, pair=False):
+        return self.special_tokens
+
+    def __call__(self, text, **kwargs):
+        _, payload = self.engine.request({"op": "offsets", "text": text})
+        return {"offset_mapping": [tuple(pair) for pair in np.frombuffer(payload, dtype="int32").reshape(-1, 2)]}
+
+
+class RemoteEmbeddingEngine:
+    """
+    Drop-in replacement for EmbeddingEngine that embeds through the embedding
+    service. Each thread keeps its own connection open; a broken connection is
+    reopened once (the service may have been restarted).
+    """
+
+    def __init__(self, socket_path, timeout=30.0, batch_size=64):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self._local = threading.local()
+        self._info = None
+
+    def _connect(self):
+        deadline = time.monotonic() + CONNECT_RETRY_SECONDS
+        delay = 0.05
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                # Connect in blocking mode: with a timeout set, a full listen
+                # backlog fails at once (EAGAIN) instead of waiting its turn
+                sock.connect(self.socket_path)
+                sock.settimeout(self.timeout)
+                return sock
+            except OSError as e:
+                sock.close()
+                # Refused or missing: the service is restarting, try again shortly
+                retry = isinstance(e, (BlockingIOError, ConnectionRefusedError, FileNotFoundError))
+                if not retry or time.monotonic() + delay > deadline:
+                    raise EmbeddingServiceError(f"Embedding service not reachable at {self.socket_path}: {e}") from e
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
+    def request(self, header):
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                send_message(sock, header)
+                response, payload = recv_message(sock)
+                break
+            except (ConnectionError, OSError) as e:
+                sock.close()
+                self._local.sock = None
+                if attempt == 2 or isinstance(e, socket.timeout):
+                    raise EmbeddingServiceError(f"Embedding service request failed: {e}") from e
+        if "error" in response:
+            raise EmbeddingServiceError(response["error"])
+        return response, payload
+
+    @property
+    def info(self):
+        if self._info is None:
+            self._info, _ = self.request({"op": "info"})
+        return self._info
+
+    @property
+    def dimension(self):
+        return self.info["dimension"]
+
+    @property
+    def max_tokens(self):
+        return self.info["max_tokens"]
+
+    @property
+    def tokenizer(self):
+        if not self.info["fast_tokenizer"]:
+            return None
+        return RemoteTokenizer(self, self.info["special_tokens"])
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        # Large requests go in pieces, so a chat query never waits behind a whole document
+        parts = []
+        for start in range(0, len(texts), self.batch_size):
+            response, payload = self.request({"op": "encode", "texts": list(texts[start:start + self.batch_size])})
+            parts.append(np.frombuffer(payload, dtype="float32").reshape(response["rows"], response["dimension"]))
+        return np.vstack(parts)
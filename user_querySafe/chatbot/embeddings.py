@@ -0,0 +1,77 @@
+import numpy as np
+from django.conf import settings
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Supported backends:
+# - "torch":      SentenceTransformer in fp32 (the original behaviour)
+# - "torch-int8": same model with its Linear layers dynamically quantized to int8
+# - "onnx":       ONNX Runtime through sentence-transformers (needs optimum + onnxruntime);
+#                 EMBEDDING_ONNX_FILE can point at a quantized export such as
+#                 "onnx/model_qint8_avx512.onnx"
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx")
+
+
+def load_embedding_model(backend="torch", onnx_file=None):
+    from sentence_transformers import SentenceTransformer
+
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+    if backend == "torch-int8":
+        import torch
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class EmbeddingEngine:
+    """
+    Batched CPU embedding of texts.
+    Texts are sorted by length before batching, so every batch holds texts of
+    similar length and little time is spent on padding tokens; results are
+    returned in the original order as a float32 array.
+    """
+
+    def __init__(self, model, batch_size=64):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+
+    @classmethod
+    def from_settings(cls):
+        model = load_embedding_model(settings.EMBEDDING_BACKEND, settings.EMBEDDING_ONNX_FILE)
+        return cls(model, batch_size=settings.EMBEDDING_BATCH_SIZE)
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    @property
+    def tokenizer(self):
+        return getattr(self.model, "tokenizer", None)
+
+    @property
+    def max_tokens(self):
+        """Longest text (in tokens) the model embeds whole; the rest of a longer text is dropped."""
+        tokenizer = self.tokenizer
+        special = tokenizer.num_special_tokens_to_add() if tokenizer is not None else 0
+        return self.model.max_seq_length - special
+
+    def encode(self, texts):
+        if not texts:
+            return np.zeros((0, self.dimension), dtype="float32")
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = self.model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+            embeddings[batch] = vectors
+        return embeddings
+
@@ -0,0 +1,139 @@
+import os
+import threading
+from collections import OrderedDict
+
+import faiss
+
+from .chunk_store import ChunkStore
+from .storage import chunks_path, ensure_chatbot_artifacts, index_path
+
+# Flat indexes keep their vectors as one raw block in the file, so FAISS can
+# search them straight from a read-only mapping: the pages are shared by every
+# worker through the OS page cache and only the parts a search touches are read.
+# FAISS builds without IO_FLAG_MMAP_IFC read the index into memory instead.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) and faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def read_index(path, mmap=True):
+    """Open a chatbot index for searching, memory-mapped when FAISS supports it for its type."""
+    if mmap and MMAP_FLAGS:
+        try:
+            return faiss.read_index(path, MMAP_FLAGS)
+        except RuntimeError as e:
+            print(f"  ⚠️  Could not memory-map {path}, reading it into memory: {e}")
+    return faiss.read_index(path)
+
+
+class LoadedIndex:
+    """A chatbot's FAISS index and chunk store, as loaded by IndexCache."""
+
+    def __init__(self, index, chunks, signature, size):
+        self.index = index
+        self.chunks = chunks
+        self.signature = signature
+        self.size = size
+
+
+def _file_signature(*paths):
+    # The pipeline replaces both files on retrain, which changes inode and mtime
+    signature = []
+    for path in paths:
+        stat = os.stat(path)
+        signature.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class IndexCache:
+    """
+    Per-process LRU cache of loaded chatbot indexes, so a chat message does not
+    read the index from disk again. Every lookup stats the index and chunk
+    store and reloads them when a retrain replaced either file. Entries are
+    evicted least recently used first once their files add up to more than
+    `max_bytes` (0 disables caching). With `mmap` the indexes are searched from
+    the mapped file instead of a copy in this worker's heap. Safe to use from
+    several threads; FAISS searches and chunk reads on a shared entry are
+    read-only.
+    """
+
+    def __init__(self, max_bytes, mmap=True):
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = self.reloads = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _paths(self, chatbot_id):
+        paths = (index_path(chatbot_id), chunks_path(chatbot_id))
+        try:
+            return paths, _file_signature(*paths)
+        except FileNotFoundError:
+            pass
+        # Not trained yet, or still in the flat layout of older versions
+        paths = ensure_chatbot_artifacts(chatbot_id)
+        if not paths:
+            return None, None
+        try:
+            return paths, _file_signature(*paths)
+        except FileNotFoundError:
+            return None, None
+
+    def get(self, chatbot_id):
+        """The chatbot's LoadedIndex, or None when it has no trained data."""
+        paths, signature = self._paths(chatbot_id)
+        if paths is None:
+            self._discard(chatbot_id)
+            return None
+        with self.lock:
+            entry = self.entries.get(chatbot_id)
+            if entry is not None and entry.signature == signature:
+                self.entries.move_to_end(chatbot_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            if entry is not None:
+                self.reloads += 1
+
+        entry = LoadedIndex(
+            read_index(paths[0], self.mmap),
+            ChunkStore(paths[1]),
+            signature,
+            signature[0][2] + signature[1][2],
+        )
+        if entry.index.ntotal != len(entry.chunks) or not self.max_bytes:
+            # Caught between the two file replacements of a retrain (or caching
+            # is off): use it for this request only
+            return entry
+        with self.lock:
+            previous = self.entries.pop(chatbot_id, None)
+            if previous is not None:
+                self.size -= previous.size
+            self.entries[chatbot_id] = entry
+            self.size += entry.size
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                # Evicted stores are closed by garbage collection once no request uses them
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+                self.evictions += 1
+            stats = self.stats()
+        print(f"📦 Index cache loaded chatbot {chatbot_id} "
+              f"({stats['entries']} cached, {stats['megabytes']} MB, hit rate {stats['hit_rate']})")
+        return entry
+
+    def _discard(self, chatbot_id):
+        with self.lock:
+            entry = self.entries.pop(chatbot_id, None)
+            if entry is not None:
+                self.size -= entry.size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "megabytes": round(self.size / (1024 * 1024), 1),
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
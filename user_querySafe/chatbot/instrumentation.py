@@ -0,0 +1,89 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Counters every stage can report; stages only fill in the ones that apply
+COUNTERS = ("pages", "chunks", "vectors", "bytes_read", "bytes_written", "api_calls", "failures")
+
+
+class StageStats:
+    """
+    Thread-safe measurements of one pipeline stage.
+    - wall_time: first activity to last activity of the stage; stages overlap,
+      so these add up to more than the run's wall time
+    - busy_time: time spent inside timed() summed over all worker threads
+    - API call latencies (seconds), reported as percentiles
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.first = None
+        self.last = None
+        self.busy_time = 0.0
+        self.latencies = []
+        for counter in COUNTERS:
+            setattr(self, counter, 0)
+        self._lock = threading.Lock()
+
+    def mark(self, now=None):
+        """Extend the stage's wall time span to `now`."""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self.first = now if self.first is None else min(self.first, now)
+            self.last = now if self.last is None else max(self.last, now)
+
+    @contextmanager
+    def timed(self):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            end = time.perf_counter()
+            self.mark(start)
+            self.mark(end)
+            with self._lock:
+                self.busy_time += end - start
+
+    def add(self, **counts):
+        with self._lock:
+            for counter, value in counts.items():
+                setattr(self, counter, getattr(self, counter) + value)
+
+    def record_call(self, seconds):
+        with self._lock:
+            self.api_calls += 1
+            self.latencies.append(seconds)
+
+    @property
+    def wall_time(self):
+        if self.first is None:
+            return 0.0
+        return self.last - self.first
+
+    def latency_percentile(self, q):
+        """q-th percentile of the call latencies in milliseconds, None without calls."""
+        with self._lock:
+            if not self.latencies:
+                return None
+            return float(np.percentile(self.latencies, q)) * 1000
+
+
+class PipelineRecorder:
+    """Collects StageStats for one pipeline run, stages are kept in first-use order."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def stage(self, name):
+        with self._lock:
+            if name not in self.stages:
+                self.stages[name] = StageStats(name)
+            return self.stages[name]
+
+    @property
+    def wall_time(self):
+        return time.perf_counter() - self.started
@@ -1,242 +1,555 @@
+import copy
 import os
-import time
-import fitz
-import re
-import json
 import faiss
 import numpy as np
 from collections import defaultdict
+from threading import Lock
 from tqdm import tqdm
-from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from google import genai
-
-# ----- Paths -----
-BASE_DIR = "documents"
-PDF_DIR = os.path.join(BASE_DIR, "files_uploaded")
-IMAGE_DIR = os.path.join(BASE_DIR, "files_images")
-TEXT_DIR = os.path.join(BASE_DIR, "files_captions")
-CHUNK_DIR = os.path.join(BASE_DIR, "files_chunks")
-INDEX_DIR = os.path.join(BASE_DIR, "vector_index")
-META_DIR = os.path.join(BASE_DIR, "chunk-metadata")
-
-# Create folders if they don't exist
-for folder in [IMAGE_DIR, TEXT_DIR, CHUNK_DIR, INDEX_DIR, META_DIR]:
-    os.makedirs(folder, exist_ok=True)
-
-# ----- Models & Config -----
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-PROJECT_ID = "metricvibes-1718777660306"
-REGION = "us-central1"
-client = genai.Client(vertexai=True, project=PROJECT_ID, location=REGION)
-
-# ----- Helper: Build Gemini Prompt -----
-def build_prompt(image_data):
-    return [{
-        "role": "user",
-        "parts": [
-            {
-                "text": (
-                    "You are a visual analysis expert. Extract and describe every element in the image including:\n"
-                    "- Text (as-is)\n"
-                    "- Tables (as plain readable text)\n"
-                    "- Charts/graphs (with insights and data)\n"
-                    "- Images/diagrams (detailed description)\n"
-                    "Output must be clean, complete, and human-readable."
-                )
-            },
-            {"inline_data": {"mime_type": "image/png", "data": image_data}},
-        ]
-    }]
-
-# ----- Wait for File Uploads to Stabilize -----
-def wait_for_file_uploads(chatbot_id, wait_duration=10, check_interval=2):
-    """
-    Wait until the latest modification time for PDFs (of the given chatbot)
-    is older than wait_duration seconds, meaning no new file upload is occurring.
-    """
-    print(f"\nWaiting for file uploads to finish for chatbot {chatbot_id}...")
-    while True:
-        files = [f for f in os.listdir(PDF_DIR)
-                 if f.startswith(chatbot_id + "_") and f.lower().endswith(".pdf")]
-        if not files:
-            print("  No files found yet; waiting...")
-            time.sleep(check_interval)
-            continue
-        mod_times = [os.path.getmtime(os.path.join(PDF_DIR, f)) for f in files]
-        latest_mod = max(mod_times)
-        elapsed = time.time() - latest_mod
-        if elapsed >= wait_duration:
-            break
-        else:
-            print(f"  Waiting... last upload was {elapsed:.1f} sec ago")
-            time.sleep(check_interval)
-    print("File uploads are stable. Proceeding with pipeline.")
+from django.conf import settings
+from django.db import transaction
+from .caption_cache import CaptionCache
+from .captioning import CaptionEngine
+from .checkpoints import CHECKPOINT_MIME_TYPE, PageCheckpoints
+from .chunk_store import ChunkStore, write_chunk_store
+from .chunking import TokenChunker
+from .instrumentation import PipelineRecorder, StageStats
+from .progress import ProgressReporter, clear_progress
+from .registry import get_embedding_engine, get_genai_client
+from .rasterizer import TEXT_MIME_TYPE, iter_render_results, page_file_name, plan_render_tasks
+from .storage import (
+    captions_path,
+    checkpoints_dir,
+    chunks_path,
+    ensure_chatbot_artifacts,
+    index_path,
+    pages_dir,
+    read_manifest,
+    write_manifest,
+)
+from .streaming import Stage, chain_sources, run_stages
+
+# ----- Helper: Page Triage Thresholds -----
+def get_triage_settings():
+    if not settings.PIPELINE_TRIAGE_ENABLED:
+        return None
+    return {
+        "min_text_chars": settings.PIPELINE_TRIAGE_MIN_TEXT_CHARS,
+        "max_visual_coverage": settings.PIPELINE_TRIAGE_MAX_VISUAL_COVERAGE,
+        "max_drawings": settings.PIPELINE_TRIAGE_MAX_DRAWINGS,
+    }
+
+# ----- Helper: Page Render Settings -----
+def get_render_settings(chatbot_id):
+    return {
+        "min_dpi": settings.PIPELINE_RENDER_MIN_DPI,
+        "max_dpi": settings.PIPELINE_RENDER_MAX_DPI,
+        "max_pixels": settings.PIPELINE_RENDER_MAX_PIXELS,
+        "min_glyph_px": settings.PIPELINE_RENDER_MIN_GLYPH_PX,
+        "image_format": settings.PIPELINE_RENDER_IMAGE_FORMAT,
+        "quality": settings.PIPELINE_RENDER_QUALITY,
+        "grayscale": settings.PIPELINE_RENDER_GRAYSCALE,
+        # Page files are only kept on disk for debugging
+        "keep_dir": pages_dir(chatbot_id) if settings.PIPELINE_KEEP_PAGE_IMAGES else None,
+    }
+
+# ----- Helper: Artifact Base Name of an Uploaded PDF -----
+def get_base_name(pdf_file):
+    return os.path.splitext(os.path.basename(pdf_file))[0]
+
+# ----- Helper: Size of a Page Payload (text or image bytes) -----
+def payload_size(payload):
+    return len(payload.encode("utf-8")) if isinstance(payload, str) else len(payload)
+
+# ----- Helper: Total Size of the Files that Exist -----
+def file_sizes(*paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
 
 # ===============================================
-# STEP 1: Convert PDFs to Images (Sequential)
-def convert_pdf_to_images(chatbot_id):
-    print(f"\nSTEP 1: Converting PDFs to Images for chatbot {chatbot_id}")
-    pdf_files = [f for f in os.listdir(PDF_DIR)
-                 if f.startswith(chatbot_id + "_") and f.lower().endswith(".pdf")]
-    if not pdf_files:
-        print("  ⚠️  No PDFs found to convert.")
-        return
-    for pdf_file in pdf_files:
-        pdf_path = os.path.join(PDF_DIR, pdf_file)
-        base_name = os.path.splitext(pdf_file)[0]
-        print(f"  ➤ Converting {pdf_file}...")
-        try:
-            doc = fitz.open(pdf_path)
-            for page_num in range(len(doc)):
-                page = doc.load_page(page_num)
-                pix = page.get_pixmap(dpi=200)
-                image_filename = f"{base_name}_page{page_num+1}.png"
-                image_path = os.path.join(IMAGE_DIR, image_filename)
-                pix.save(image_path)
-                print(f"     ✓ Saved page {page_num+1} as {image_filename}")
-            doc.close()
-            print(f"  ✓ {pdf_file} converted successfully.")
-        except Exception as e:
-            print(f"  ✗ Error converting {pdf_file}: {e}")
-    print("STEP 1 complete: All PDFs converted to images.")
+# STREAMING PIPELINE
+# Pages flow through bounded in-memory queues: rendering, captioning, chunking
+# and embedding all run at the same time, so a run takes about as long as its
+# slowest stage. Every run works on an explicit list of (document id, PDF path),
+# so it only touches the documents it was given; their artifacts are looked up
+# directly in the chatbot's folder (see storage.py).
+# ===============================================
+# STAGE 1: Triage pages and render visual pages to Images in memory
+# (Parallel, one fitz handle per worker process; pages are passed on as soon
+# as their page range is done)
+def iter_rendered_pages(render_tasks, workers, stats=None):
+    # Rendering happens in worker processes, so only its wall time is measured
+    stats = stats or StageStats("render")
+    stats.mark()
+    results = iter_render_results(render_tasks, workers)
+    try:
+        for task, pages, error in results:
+            stats.mark()
+            document_id, start, stop = task[1], task[2], task[3]
+            if error is not None:
+                stats.add(failures=stop - start)
+                for page_num in range(start + 1, stop + 1):
+                    yield document_id, page_num, None, None, error
+                continue
+            stats.add(pages=len(pages), bytes_written=sum(payload_size(payload) for _, payload, _ in pages))
+            for page_num, payload, mime_type in pages:
+                yield document_id, page_num, payload, mime_type, None
+    finally:
+        # Stops the process pool when the pipeline ends early
+        results.close()
 
 # ===============================================
-# STEP 2: Generate Captions (Sequential)
-def generate_captions(chatbot_id):
-    print(f"\nSTEP 2: Generating Captions for chatbot {chatbot_id}")
-    grouped = defaultdict(list)
-    img_files = sorted([f for f in os.listdir(IMAGE_DIR)
-                        if f.startswith(chatbot_id + "_") and f.endswith(".png")])
-    if not img_files:
-        print("  ⚠️  No images found to generate captions.")
-        return
-    for img in img_files:
-        base = "_".join(img.split("_")[:-1])
-        grouped[base].append(img)
-    for base, images in grouped.items():
-        print(f"  ➤ Generating caption for {base}...")
+# STAGE 2: Caption pages (Concurrent, rate limited)
+# Rendered pages are captioned by Gemini, text-layer pages are used as-is.
+# Every finished caption is checkpointed right away, pages restored from a
+# checkpoint are passed on without rendering or captioning them again.
+_caption_cache = None
+
+def get_caption_cache():
+    global _caption_cache
+    if _caption_cache is None and settings.PIPELINE_CAPTION_CACHE_MAX_MB > 0:
+        _caption_cache = CaptionCache(
+            settings.PIPELINE_CAPTION_CACHE_DIR,
+            settings.PIPELINE_CAPTION_CACHE_MAX_MB * 1024 * 1024,
+        )
+    return _caption_cache
+
+def get_caption_engine(caption_client=None, stats=None):
+    return CaptionEngine(
+        caption_client or get_genai_client(),
+        concurrency=settings.PIPELINE_CAPTION_CONCURRENCY,
+        requests_per_minute=settings.PIPELINE_CAPTION_RPM,
+        burst=settings.PIPELINE_CAPTION_BURST,
+        cache=get_caption_cache(),
+        stats=stats,
+    )
+
+def iter_checkpointed_pages(restored):
+    for document_id, pages in restored.items():
+        for page_num, entry in sorted(pages.items()):
+            yield document_id, page_num, entry, CHECKPOINT_MIME_TYPE, None
+
+def caption_page(engine, payload, mime_type):
+    if mime_type == TEXT_MIME_TYPE:
+        return payload.strip()
+    return engine.caption(payload, mime_type)
+
+class IncompleteDocuments(Exception):
+    """
+    Some documents of a run could not be trained; the others are in the index.
+    `retry` lists documents with pages that failed to render or caption (their
+    other pages stay checkpointed), `unreadable` the PDFs that cannot be opened.
+    """
+
+    def __init__(self, retry, unreadable=()):
+        self.retry = list(retry)
+        self.unreadable = list(unreadable)
+        super().__init__(
+            f"{len(self.retry)} document(s) with failed pages, {len(self.unreadable)} unreadable document(s)"
+        )
+
+class DocumentAssembler:
+    """
+    Collects captioned pages (from several caption threads) and releases a
+    document's full caption text, in page order, once its last page arrives.
+    A page added without text failed; its document is never released and is
+    counted in `failed` instead, so no error ever ends up in the index.
+    """
+
+    def __init__(self, page_counts):
+        self.page_counts = page_counts
+        self.pages = defaultdict(dict)
+        self.failed = {}
+        self.lock = Lock()
+
+    def add(self, document_id, page_num, page_label, text):
+        with self.lock:
+            pages = self.pages[document_id]
+            pages[page_num] = (page_label, text)
+            if len(pages) < self.page_counts[document_id]:
+                return []
+            del self.pages[document_id]
+            failed = sum(1 for _, page_text in pages.values() if page_text is None)
+            if failed:
+                self.failed[document_id] = failed
+                return []
         full_text = ""
-        for img in sorted(images):
-            image_path = os.path.join(IMAGE_DIR, img)
-            try:
-                with open(image_path, "rb") as f:
-                    image_data = f.read()
-                prompt = build_prompt(image_data)
-                response = client.models.generate_content(
-                    model="gemini-2.0-flash-001",
-                    contents=prompt
-                )
-                caption = response.text.strip()
-                full_text += f"\n--- Page: {img} ---\n{caption}\n\n"
-                print(f"     ✓ Caption generated for {img}")
-            except Exception as e:
-                full_text += f"\n--- Page: {img} ---\nError: {e}\n\n"
-                print(f"     ✗ Error generating caption for {img}: {e}")
-        caption_filename = f"{base}.txt"
-        caption_path = os.path.join(TEXT_DIR, caption_filename)
-        with open(caption_path, "w", encoding="utf-8") as f:
-            f.write(full_text)
-        print(f"  ✓ Captions saved to {caption_filename}")
-    print("STEP 2 complete: All images captioned.")
+        for num in sorted(pages):
+            page_label, text = pages[num]
+            full_text += f"\n--- Page: {page_label} ---\n{text}\n\n"
+        return [(document_id, full_text)]
 
 # ===============================================
-# STEP 3: Chunk Captions into a Single File per PDF (Sequential)
-def chunk_text(chatbot_id):
-    print(f"\nSTEP 3: Chunking Caption Files for chatbot {chatbot_id}")
-    files = [f for f in os.listdir(TEXT_DIR)
-             if f.startswith(chatbot_id + "_") and f.endswith(".txt")]
-    if not files:
-        print("  ⚠️  No caption files found to chunk.")
-        return
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    for file in files:
-        caption_path = os.path.join(TEXT_DIR, file)
-        with open(caption_path, "r", encoding="utf-8") as f:
-            raw_text = f.read()
-        chunks = splitter.split_text(raw_text)
-        chunk_filename = file.replace(".txt", "-chunks.txt")
-        chunk_path = os.path.join(CHUNK_DIR, chunk_filename)
-        with open(chunk_path, "w", encoding="utf-8") as out:
-            for idx, chunk in enumerate(chunks, 1):
-                out.write(f"--- Chunk {idx} ---\n{chunk}\n\n")
-        print(f"  ✓ {file} chunked into {chunk_filename}")
-    print("STEP 3 complete: All caption files chunked.")
+# STAGE 3: Chunk a Document's Captions
+# Chunks are sized in tokens of the embedding model, so every chunk is embedded
+# whole instead of being truncated at the model's sequence limit.
+_text_splitter = None
+
+def get_text_splitter():
+    global _text_splitter
+    if _text_splitter is None:
+        engine = get_embedding_engine()
+        if TokenChunker.supports(engine.tokenizer):
+            max_tokens = min(settings.PIPELINE_CHUNK_MAX_TOKENS or engine.max_tokens, engine.max_tokens)
+            # Chunking runs next to the embed stage, and encode() reconfigures truncation on the
+            # model's tokenizer each call: a shared one fails ("Already borrowed") or truncates chunks
+            tokenizer = copy.deepcopy(engine.tokenizer)
+            _text_splitter = TokenChunker(tokenizer, max_tokens, settings.PIPELINE_CHUNK_OVERLAP_TOKENS)
+        else:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            # No offsets from this tokenizer: fall back to character chunks
+            print("  ⚠️  Embedding tokenizer has no offsets, chunking by characters.")
+            _text_splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
+    return _text_splitter
+
+def chunk_document(caption_file, full_text):
+    os.makedirs(os.path.dirname(caption_file), exist_ok=True)
+    with open(caption_file, "w", encoding="utf-8") as f:
+        f.write(full_text)
+    chunks = [c.strip() for c in get_text_splitter().split_text(full_text) if c.strip()]
+    print(f"  ✓ {caption_file} chunked into {len(chunks)} chunk(s)")
+    return chunks
 
 # ===============================================
-# STEP 4: Embed Chunks and Build a Single FAISS Index (Sequential)
-def embed_chunks(chatbot_id):
-    print(f"\nSTEP 4: Embedding Chunks for chatbot {chatbot_id}")
+# STAGE 4: Embed a Document's Chunks
+def embed_document(chunks):
+    return get_embedding_engine().encode(chunks)
+
+# ===============================================
+# Append new documents to the Chatbot's FAISS Index and manifest
+def append_to_index(chatbot_id, documents):
+    """Append documents, a list of (document_id, name, pages, chunks, vectors)."""
+    new_chunks = [chunk for _, _, _, chunks, _ in documents for chunk in chunks]
+    embeddings = np.vstack([vectors for _, _, _, _, vectors in documents])
+    compress = settings.PIPELINE_CHUNK_COMPRESSION
+    manifest = read_manifest(chatbot_id)
     all_chunks = []
-    chunk_files = [f for f in os.listdir(CHUNK_DIR)
-                   if f.startswith(chatbot_id + "_") and f.endswith("-chunks.txt")]
-    if not chunk_files:
-        print("  ⚠️  No chunk files found for embedding.")
+    index = None
+    # Append to the existing index so earlier documents are not re-embedded
+    existing = ensure_chatbot_artifacts(chatbot_id)
+    if existing:
+        index = faiss.read_index(existing[0])
+        with ChunkStore(existing[1]) as store:
+            all_chunks = list(store)
+        if index.ntotal != len(all_chunks) or index.d != embeddings.shape[1]:
+            print("  ⚠️  Existing index does not match its metadata; starting a new index.")
+            index, all_chunks = None, []
+    if index is None:
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        manifest["documents"] = {}
+    index.add(embeddings)
+    for document_id, name, pages, chunks, _ in documents:
+        manifest["documents"][str(document_id)] = {
+            "name": name,
+            "pages": pages,
+            "chunks": [len(all_chunks), len(all_chunks) + len(chunks)],
+        }
+        all_chunks.extend(chunks)
+    manifest["version"] += 1
+    manifest["dimension"] = index.d
+    manifest["vectors"] = index.ntotal
+
+    # Write to temporary files first so the chat view never reads a half-written index.
+    # Never rewrite the files in place: chat workers may have them memory-mapped.
+    index_file, chunks_file = index_path(chatbot_id), chunks_path(chatbot_id)
+    os.makedirs(os.path.dirname(index_file), exist_ok=True)
+    faiss.write_index(index, index_file + ".tmp")
+    write_chunk_store(chunks_file + ".tmp", all_chunks, compress=compress)
+    os.replace(chunks_file + ".tmp", chunks_file)
+    os.replace(index_file + ".tmp", index_file)
+    # Written last: a document listed in the manifest is in the index
+    write_manifest(chatbot_id, manifest)
+    print(f"  ✓ {len(new_chunks)} vectors appended, index now holds {index.ntotal} for chatbot {chatbot_id}")
+
+# ===============================================
+# MAIN PIPELINE FUNCTION (Streaming Flow, incremental per document)
+def process_documents(chatbot_id, documents, caption_client=None, recorder=None, user_id=None):
+    """
+    Train `documents`, a list of (document_id, pdf_path), into the chatbot's index.
+    Raises IncompleteDocuments when some of them could not be trained; every
+    other document is in the index by then.
+    """
+    # A run that died after writing the index already added some documents
+    indexed = read_manifest(chatbot_id)["documents"]
+    documents = [(str(document_id), pdf_path) for document_id, pdf_path in documents
+                 if str(document_id) not in indexed]
+    if not documents:
+        print("  ✓ All documents are already in the index.")
         return
-    for file in chunk_files:
-        chunk_path = os.path.join(CHUNK_DIR, file)
-        with open(chunk_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        chunks = re.split(r'--- Chunk \d+ ---\n', content)
-        all_chunks.extend([c.strip() for c in chunks if c.strip()])
-    if not all_chunks:
-        print("  ❌ No text chunks available to embed.")
+    print(f"\n➤ Streaming {len(documents)} document(s) through the pipeline for chatbot {chatbot_id}")
+    # Pages travel under their document id; the PDF's base name labels them in the captions
+    pdf_jobs = [(pdf_path, document_id) for document_id, pdf_path in documents]
+    names = {document_id: get_base_name(pdf_path) for document_id, pdf_path in documents}
+    checkpoints = {
+        document_id: PageCheckpoints(checkpoints_dir(chatbot_id, document_id))
+        for document_id, _ in documents
+    }
+    # Resume documents of a run that died from their page checkpoints
+    restored = {document_id: checkpoints[document_id].load() for document_id, _ in documents}
+    page_counts = {}
+    render_tasks = plan_render_tasks(
+        pdf_jobs,
+        settings.PIPELINE_RASTER_PAGES_PER_TASK,
+        render=get_render_settings(chatbot_id),
+        triage=get_triage_settings(),
+        skip=restored,
+        page_counts=page_counts,
+    )
+    restored = {
+        document_id: {num: entry for num, entry in pages.items() if num <= page_counts[document_id]}
+        for document_id, pages in restored.items() if pages and document_id in page_counts
+    }
+    # Reported by plan_render_tasks; retrying would not make them readable
+    unreadable = [document_id for document_id, _ in documents if document_id not in page_counts]
+    if restored:
+        print(f"  ✓ Resuming from {sum(len(pages) for pages in restored.values())} checkpointed page(s)")
+    if not any(page_counts.values()):
+        print("  ⚠️  No pages found to process.")
+        if unreadable:
+            raise IncompleteDocuments([], unreadable)
         return
-    print(f"  ➤ Generating embeddings for {len(all_chunks)} chunks...")
-    embeddings = embedding_model.encode(all_chunks, show_progress_bar=True)
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(np.array(embeddings).astype('float32'))
-    index_path = os.path.join(INDEX_DIR, f"{chatbot_id}-index.index")
-    meta_path = os.path.join(META_DIR, f"{chatbot_id}-chunks.json")
-    faiss.write_index(index, index_path)
-    with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump(all_chunks, f, indent=2)
-    print(f"  ✓ FAISS index and metadata saved for chatbot {chatbot_id}")
-    print("STEP 4 complete: Embedding done.")
 
-# ===============================================
-# MAIN PIPELINE FUNCTION (Sequential Flow)
+    recorder = recorder or PipelineRecorder()
+    render_stats = recorder.stage("render")
+    caption_stats = recorder.stage("caption")
+    chunk_stats = recorder.stage("chunk")
+    embed_stats = recorder.stage("embed")
+    index_stats = recorder.stage("index")
+    render_stats.add(bytes_read=file_sizes(*[pdf_path for pdf_path, _ in pdf_jobs]))
+
+    engine = get_caption_engine(caption_client, stats=caption_stats)
+    assembler = DocumentAssembler(page_counts)
+    # Page-level progress for the owner's dashboard
+    progress = ProgressReporter(chatbot_id, user_id, sum(page_counts.values())) if user_id else None
+
+    def caption_stage(page):
+        document_id, page_num, payload, mime_type, error = page
+        page_label = f"{names[document_id]}_page{page_num}"
+        if mime_type == CHECKPOINT_MIME_TYPE:
+            page_label, text = payload
+            caption_stats.add(pages=1)
+            if progress:
+                progress.page_done()
+            return assembler.add(document_id, page_num, page_label, text)
+        with caption_stats.timed():
+            if error is None:
+                page_label = page_file_name(names[document_id], page_num, mime_type)
+                caption_stats.add(bytes_read=payload_size(payload))
+                try:
+                    text = caption_page(engine, payload, mime_type)
+                except Exception as e:
+                    error = e
+                    print(f"     ✗ Error generating caption for {page_label}: {e}")
+                else:
+                    try:
+                        checkpoints[document_id].save(page_num, page_label, text)
+                    except OSError as e:
+                        print(f"     ⚠️  Could not checkpoint {page_label}: {e}")
+            if error is not None:
+                # Left out: the document is retried, this page is rendered and captioned again
+                text = None
+                caption_stats.add(failures=1)
+            caption_stats.add(pages=1, bytes_written=payload_size(text or ""))
+        if progress:
+            progress.page_done()
+        return assembler.add(document_id, page_num, page_label, text)
+
+    def chunk_stage(document):
+        document_id, full_text = document
+        with chunk_stats.timed():
+            chunks = chunk_document(captions_path(chatbot_id, document_id), full_text)
+        chunk_stats.add(
+            chunks=len(chunks),
+            bytes_read=payload_size(full_text),
+            bytes_written=payload_size(full_text) + sum(payload_size(chunk) for chunk in chunks),
+        )
+        return [(document_id, chunks)]
+
+    def embed_stage(document):
+        document_id, chunks = document
+        if not chunks:
+            return []
+        with embed_stats.timed():
+            vectors = embed_document(chunks)
+        embed_stats.add(chunks=len(chunks), vectors=len(vectors), bytes_written=vectors.nbytes)
+        return [(document_id, chunks, vectors)]
+
+    embedded = run_stages(
+        chain_sources(
+            iter_checkpointed_pages(restored),
+            iter_rendered_pages(render_tasks, settings.PIPELINE_RASTER_WORKERS, render_stats),
+        ),
+        [
+            Stage("caption", caption_stage, engine.concurrency),
+            Stage("chunk", chunk_stage),
+            Stage("embed", embed_stage),
+        ],
+        queue_size=settings.PIPELINE_QUEUE_SIZE,
+    )
+    if engine.cache:
+        print(f"  ✓ {engine.cache_hits} page(s) served from the caption cache")
+
+    for document_id, pages in assembler.failed.items():
+        print(f"  ✗ {pages} page(s) of {names[document_id]} failed, the document is left out of the index")
+
+    # Documents finish in any order; keep the index in upload order
+    order = {document_id: position for position, (document_id, _) in enumerate(documents)}
+    embedded.sort(key=lambda document: order[document[0]])
+    new_chunks = sum(len(chunks) for _, chunks, _ in embedded)
+    if new_chunks:
+        index_files = (index_path(chatbot_id), chunks_path(chatbot_id))
+        bytes_read = file_sizes(*index_files)
+        with index_stats.timed():
+            append_to_index(chatbot_id, [
+                (document_id, names[document_id], page_counts[document_id], chunks, vectors)
+                for document_id, chunks, vectors in embedded
+            ])
+        index_stats.add(chunks=new_chunks, vectors=new_chunks,
+                        bytes_read=bytes_read, bytes_written=file_sizes(*index_files))
+    else:
+        print("  ❌ No text chunks available to embed.")
+    # Finished documents no longer need their page checkpoints; failed ones resume from them
+    for document_id, document_checkpoints in checkpoints.items():
+        if document_id not in assembler.failed:
+            document_checkpoints.clear()
+    if assembler.failed or unreadable:
+        raise IncompleteDocuments(assembler.failed, unreadable)
+
 def process_pipeline(chatbot_id):
+    """
+    Train all pending documents of a chatbot. Must not run concurrently for the
+    same chatbot (the Celery task holds a per-chatbot lock), so documents left in
+    'processing' belong to a run that died and are picked up again.
+    Errors are re-raised so the Celery task can retry.
+    """
+    from django.utils import timezone
+    from user_querySafe.models import Chatbot, ChatbotDocument, PipelineRun
+    chatbot = Chatbot.objects.select_related('user').get(chatbot_id=chatbot_id)
+    user_id = chatbot.user.user_id
+    run = PipelineRun.objects.create(chatbot=chatbot)
+    recorder = PipelineRecorder()
     try:
         print(f"\n🚀 Starting processing pipeline for chatbot: {chatbot_id}")
-        # Ensure file uploads are complete before starting the pipeline
-        wait_for_file_uploads(chatbot_id)
-        convert_pdf_to_images(chatbot_id)
-        generate_captions(chatbot_id)
-        chunk_text(chatbot_id)
-        embed_chunks(chatbot_id)
+
+        # Documents uploaded while a run is in progress are picked up by the next loop
+        while True:
+            documents = list(ChatbotDocument.objects.filter(
+                chatbot__chatbot_id=chatbot_id, status__in=['pending', 'processing']
+            ).order_by('id'))
+            if not documents:
+                break
+            doc_ids = [doc.id for doc in documents]
+            print(f"➤ Processing {len(documents)} new document(s): "
+                  f"{', '.join(os.path.basename(doc.document.name) for doc in documents)}")
+            ChatbotDocument.objects.filter(id__in=doc_ids).update(status='processing')
+            run.documents += len(documents)
+            incomplete = None
+            try:
+                process_documents(chatbot_id, [(doc.id, doc.document.path) for doc in documents],
+                                  recorder=recorder, user_id=user_id)
+            except IncompleteDocuments as e:
+                incomplete = e
+            except Exception:
+                # Back to pending so a retry of the task processes them again
+                ChatbotDocument.objects.filter(id__in=doc_ids).update(status='pending')
+                raise
+            retry_ids = [doc.id for doc in documents if incomplete and str(doc.id) in incomplete.retry]
+            unreadable_ids = [doc.id for doc in documents if incomplete and str(doc.id) in incomplete.unreadable]
+            ChatbotDocument.objects.filter(id__in=unreadable_ids).update(status='failed')
+            ChatbotDocument.objects.filter(id__in=retry_ids).update(status='pending')
+            ChatbotDocument.objects.filter(id__in=doc_ids).exclude(id__in=retry_ids + unreadable_ids).update(
+                status='processed', processed_at=timezone.now()
+            )
+            if retry_ids:
+                # The task retry renders and captions only their missing pages
+                raise incomplete
         print(f"\n🎉 Pipeline completed for chatbot {chatbot_id}")
         
         # Update chatbot status and dataset name
-        from user_querySafe.models import Chatbot
         chatbot_obj = Chatbot.objects.get(chatbot_id=chatbot_id)
         
         # Set status to trained
         chatbot_obj.status = "trained"
         
-        # Set dataset name to the vector DB filename
-        vector_db_name = f"{chatbot_id}-index.index"
+        # Set dataset name to the vector DB file, relative to the artifact root
+        vector_db_name = os.path.relpath(index_path(chatbot_id), settings.PIPELINE_ARTIFACT_ROOT)
         chatbot_obj.dataset_name = vector_db_name
         
         chatbot_obj.save()
+        clear_progress(chatbot_id, user_id)
         print(f"✅ Chatbot {chatbot_id} updated:")
         print(f"   • Status: trained")
         print(f"   • Dataset: {vector_db_name}")
+        save_pipeline_run(run, recorder, 'succeeded')
         
     except Exception as e:
         print(f"\n❌ Pipeline error for chatbot {chatbot_id}: {e}")
+        save_pipeline_run(run, recorder, 'failed', error=repr(e))
+        raise
+
+def save_pipeline_run(run, recorder, status, error=""):
+    """Persist a run's totals and the measurements of every stage it went through."""
+    from django.utils import timezone
+    from user_querySafe.models import PipelineStage
+    stages = recorder.stages
+    run.status = status
+    run.error = error
+    run.finished_at = timezone.now()
+    run.wall_time = recorder.wall_time
+    run.pages = stages["render"].pages if "render" in stages else 0
+    run.chunks = stages["chunk"].chunks if "chunk" in stages else 0
+    run.vectors = stages["index"].vectors if "index" in stages else 0
+    run.save()
+    PipelineStage.objects.bulk_create([
+        PipelineStage(
+            run=run,
+            name=stats.name,
+            wall_time=stats.wall_time,
+            busy_time=stats.busy_time,
+            pages=stats.pages,
+            chunks=stats.chunks,
+            vectors=stats.vectors,
+            bytes_read=stats.bytes_read,
+            bytes_written=stats.bytes_written,
+            api_calls=stats.api_calls,
+            latency_p50=stats.latency_percentile(50),
+            latency_p95=stats.latency_percentile(95),
+            latency_p99=stats.latency_percentile(99),
+            failures=stats.failures,
+        )
+        for stats in stages.values()
+    ])
+    print(f"📊 Pipeline run {run.id}: {run.wall_time:.1f}s, {run.pages} page(s), {run.vectors} vector(s)")
+
+def mark_pipeline_failed(chatbot_id):
+    """Give up on a chatbot's pending documents once the task is out of retries."""
+    from user_querySafe.models import Chatbot, ChatbotDocument
+    ChatbotDocument.objects.filter(
+        chatbot__chatbot_id=chatbot_id, status__in=['pending', 'processing']
+    ).update(status='failed')
+    Chatbot.objects.filter(chatbot_id=chatbot_id).update(status='failed')
+    user_id = Chatbot.objects.filter(chatbot_id=chatbot_id).values_list('user__user_id', flat=True).first()
+    if user_id:
+        clear_progress(chatbot_id, user_id)
 
 # ===============================================
-# RUN PIPELINE IN BACKGROUND (with a simple lock to avoid duplicate runs)
-_pipeline_locks = {}
+# RUN PIPELINE IN BACKGROUND (queued PipelineJob, started by the global scheduler)
+def pipeline_lock_key(chatbot_id):
+    return f"pipeline-lock:{chatbot_id}"
+
 def run_pipeline_background(chatbot_id):
-    from threading import Thread, Lock
-    lock = _pipeline_locks.setdefault(chatbot_id, Lock())
-    if lock.locked():
-        print(f"Pipeline already running for chatbot {chatbot_id}.")
+    from user_querySafe.tasks import dispatch_pipeline
+    from .scheduler import enqueue_pipeline_job
+    # A job that is queued but not started yet will see the new documents too
+    if not enqueue_pipeline_job(chatbot_id):
+        print(f"Pipeline already queued for chatbot {chatbot_id}.")
         return
-    def pipeline_wrapper():
-        with lock:
-            process_pipeline(chatbot_id)
-    Thread(target=pipeline_wrapper, daemon=True).start()
+    dispatch_pipeline.delay()
+
+# ===============================================
+# BATCH-COMMIT HOOK: call once after all documents of a request are stored
+def schedule_pipeline(chatbot_id):
+    """
+    Start the pipeline for a chatbot as soon as the surrounding transaction
+    commits, so it sees every document saved in it (runs right away when no
+    transaction is open).
+    """
+    transaction.on_commit(lambda: run_pipeline_background(chatbot_id))
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Training progress lives in the cache (shared with the Celery worker through
+# Redis), next to a per-user version counter. Every status or progress change
+# bumps the counter, so the status endpoints can tell "nothing changed" from a
+# single cache read: polling clients get a 304 and the event stream stays idle.
+
+
+def progress_key(chatbot_id):
+    return f"pipeline-progress:{chatbot_id}"
+
+
+def status_version_key(user_id):
+    return f"chatbot-status-version:{user_id}"
+
+
+def get_status_version(user_id):
+    key = status_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock, so an evicted counter never repeats an old ETag
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_status_version(user_id):
+    key = status_version_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_status_version(user_id)
+        return cache.incr(key)
+
+
+def publish_progress(chatbot_id, user_id, done, total, message):
+    """Store the progress of a chatbot's training run and notify its owner's listeners."""
+    cache.set(progress_key(chatbot_id), {
+        "done": done,
+        "total": total,
+        "message": message,
+    }, settings.PIPELINE_PROGRESS_TIMEOUT)
+    bump_status_version(user_id)
+
+
+def clear_progress(chatbot_id, user_id):
+    """Drop a chatbot's progress once its status changed (trained, failed, ...)."""
+    cache.delete(progress_key(chatbot_id))
+    bump_status_version(user_id)
+
+
+def get_progress_many(chatbot_ids):
+    entries = cache.get_many([progress_key(chatbot_id) for chatbot_id in chatbot_ids])
+    return {chatbot_id: entries.get(progress_key(chatbot_id)) for chatbot_id in chatbot_ids}
+
+
+class ProgressReporter:
+    """
+    Counts captioned pages of a pipeline run (from several caption threads) and
+    publishes "captioned 120/300 pages" at most every `interval` seconds; pages
+    served from the caption cache or the text layer finish faster than anyone
+    can watch. The last page is always published.
+    """
+
+    def __init__(self, chatbot_id, user_id, total, interval=None):
+        self.chatbot_id = chatbot_id
+        self.user_id = user_id
+        self.total = total
+        self.interval = settings.PIPELINE_PROGRESS_INTERVAL if interval is None else interval
+        self.done = 0
+        self._published = None
+        self._lock = threading.Lock()
+
+    def page_done(self):
+        with self._lock:
+            self.done += 1
+            done = self.done
+            now = time.monotonic()
+            if done < self.total and self._published is not None and now - self._published < self.interval:
+                return
+            self._published = now
+        publish_progress(self.chatbot_id, self.user_id, done, self.total,
+                         f"captioned {done}/{self.total} pages")
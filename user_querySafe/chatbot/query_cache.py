@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+# Report the hit rate every this many lookups
+STATS_EVERY = 1000
+
+
+def normalize_query(text):
+    # Only folds what the (uncased) embedding model ignores anyway: letter case
+    # and runs of whitespace. "Pricing?" and " pricing? " share an entry,
+    # "pricing" does not, because the question mark changes the vector.
+    return " ".join(text.split()).lower()
+
+
+class QueryEmbeddingCache(ABC):
+    """
+    Maps normalized chat queries to their float32 embedding, so a question
+    asked again skips the model's forward pass. Shared by all chatbots, since
+    they share the embedding model; `model` is part of every key so vectors of
+    another model or backend are never returned. Subclasses store the vectors.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, normalized):
+        digest = hashlib.sha256(self.model.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(normalized.encode("utf-8"))
+        return f"query-embedding:{digest.hexdigest()}"
+
+    def encode(self, text, get_engine):
+        """The (1, dimension) embedding of `text`; `get_engine` is only called on a miss."""
+        normalized = normalize_query(text)
+        key = self.key(normalized)
+        vector = self._get(key)
+        with self.lock:
+            if vector is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            lookups = self.hits + self.misses
+        if lookups % STATS_EVERY == 0:
+            stats = self.stats()
+            print(f"🔁 Query embedding cache: hit rate {stats['hit_rate']} over {lookups} lookups")
+        if vector is None:
+            vector = get_engine().encode([normalized])[0]
+            self._set(key, vector)
+        return vector[None]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    @abstractmethod
+    def _get(self, key):
+        """The stored vector for `key`, or None."""
+
+    @abstractmethod
+    def _set(self, key, vector):
+        """Store `vector` under `key`."""
+
+
+class LocalQueryCache(QueryEmbeddingCache):
+    """Least recently used cache of at most `max_entries` vectors in this worker's memory."""
+
+    def __init__(self, model, max_entries):
+        super().__init__(model)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def _get(self, key):
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+            return vector
+
+    def _set(self, key, vector):
+        if self.max_entries <= 0:
+            return
+        vector = np.array(vector, dtype="float32")
+        vector.setflags(write=False)  # handed out to every request that asks the same question
+        with self.lock:
+            self.entries[key] = vector
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return {**super().stats(), "entries": len(self.entries)}
+
+
+class DjangoQueryCache(QueryEmbeddingCache):
+    """
+    Vectors kept in a Django cache (Redis in production), shared by every web
+    worker; the cache backend decides eviction. Hit counters are per process.
+    """
+
+    def __init__(self, model, cache, timeout):
+        super().__init__(model)
+        self.cache = cache
+        self.timeout = timeout
+
+    def _get(self, key):
+        # An unreachable cache only costs the forward pass, never the chat answer
+        try:
+            data = self.cache.get(key)
+        except Exception as e:
+            print(f"  ⚠️  Query embedding cache unavailable: {e}")
+            return None
+        return np.frombuffer(data, dtype="float32") if data is not None else None
+
+    def _set(self, key, vector):
+        try:
+            self.cache.set(key, np.asarray(vector, dtype="float32").tobytes(), self.timeout)
+        except Exception as e:
+            print(f"  ⚠️  Query embedding cache unavailable: {e}")
@@ -0,0 +1,244 @@
+import io
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+import fitz
+
+# NOTE: this module is imported by spawned worker processes, so keep it free of
+# Django, torch and Vertex imports - the children only need fitz (and Pillow for WebP).
+
+TEXT_MIME_TYPE = "text/plain"
+
+# image_format -> (file extension, mime type)
+IMAGE_FORMATS = {
+    "png": ("png", "image/png"),
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+
+# Default render settings, overridden from Django settings by the pipeline
+DEFAULT_RENDER = {
+    "min_dpi": 72,
+    "max_dpi": 200,
+    "max_pixels": 2_000_000,
+    "min_glyph_px": 20,
+    "image_format": "jpeg",
+    "quality": 80,
+    "grayscale": False,
+    "keep_dir": None,
+}
+
+
+def page_file_name(base_name, page_num, mime_type):
+    """Name of a page artifact (page_num is 1-based), e.g. foo.pdf_page3.jpg"""
+    if mime_type == TEXT_MIME_TYPE:
+        extension = "txt"
+    else:
+        extension = next(ext for ext, mime in IMAGE_FORMATS.values() if mime == mime_type)
+    return f"{base_name}_page{page_num}.{extension}"
+
+
+def _coverage(rects, page_rect):
+    page_area = page_rect.width * page_rect.height
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for rect in rects:
+        clipped = fitz.Rect(rect) & page_rect
+        if not clipped.is_empty:
+            covered += clipped.width * clipped.height
+    return min(1.0, covered / page_area)
+
+
+def triage_page(page, min_text_chars, max_visual_coverage, max_drawings):
+    """
+    Decide whether a page needs visual understanding.
+    Returns (needs_visual, native_text). A page goes to captioning when it has
+    almost no text layer (scans, image-only slides), when images or vector
+    drawings cover a large part of it (photos, charts), or when it carries many
+    vector paths (ruled tables, diagrams). Everything else is read natively.
+    """
+    text = page.get_text("text").strip()
+    if len("".join(text.split())) < min_text_chars:
+        return True, text
+    page_rect = page.rect
+    image_rects = [info["bbox"] for info in page.get_image_info()]
+    if _coverage(image_rects, page_rect) > max_visual_coverage:
+        return True, text
+    drawings = page.get_drawings()
+    if len(drawings) > max_drawings:
+        return True, text
+    if _coverage([d["rect"] for d in drawings], page_rect) > max_visual_coverage:
+        return True, text
+    return False, text
+
+
+def choose_dpi(page, min_dpi, max_dpi, max_pixels, min_glyph_px):
+    """
+    Pick the render resolution for a page. Pages with a text layer are rendered
+    just sharp enough for their smallest text to be about `min_glyph_px` pixels
+    high; pages without one (scans, pure graphics) get `max_dpi`. The result is
+    always capped so the image stays within the `max_pixels` budget.
+    """
+    sizes = [
+        span["size"]
+        for block in page.get_text("dict")["blocks"]
+        for line in block.get("lines", [])
+        for span in line["spans"]
+        if span["text"].strip()
+    ]
+    dpi = min_glyph_px * 72 / max(min(sizes), 1) if sizes else max_dpi
+    dpi = max(min_dpi, min(dpi, max_dpi))
+    area_sq_inch = (page.rect.width / 72) * (page.rect.height / 72)
+    if area_sq_inch > 0:
+        dpi = min(dpi, math.sqrt(max_pixels / area_sq_inch))
+    return max(1, int(dpi))
+
+
+def encode_pixmap(pix, image_format, quality):
+    """Encode a pixmap, returns (bytes, mime_type)."""
+    mime_type = IMAGE_FORMATS[image_format][1]
+    if image_format == "png":
+        return pix.tobytes("png"), mime_type
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=quality), mime_type
+    # fitz cannot write WebP, hand the raw samples to Pillow
+    from PIL import Image
+    mode = "L" if pix.n == 1 else "RGB"
+    image = Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+    buffer = io.BytesIO()
+    image.save(buffer, format="WEBP", quality=quality)
+    return buffer.getvalue(), mime_type
+
+
+def render_page(page, render):
+    """Render one page in memory, returns (image bytes, mime_type)."""
+    dpi = choose_dpi(page, render["min_dpi"], render["max_dpi"], render["max_pixels"], render["min_glyph_px"])
+    colorspace = fitz.csGRAY if render["grayscale"] else fitz.csRGB
+    pix = page.get_pixmap(dpi=dpi, colorspace=colorspace, alpha=False)
+    return encode_pixmap(pix, render["image_format"], render["quality"])
+
+
+def render_page_range(pdf_path, key, start, stop, render, triage=None):
+    """
+    Process pages [start, stop) of a single PDF in memory.
+    Every call opens its own fitz handle, so it is safe to run in a worker process.
+    With `triage` (a dict of triage_page() thresholds), text-only pages are not
+    rasterized and their native text is returned instead.
+    Returns a list of (page_num, payload, mime_type) in page order, page_num
+    being 1-based and payload the text (text/plain) or the encoded image.
+    When render["keep_dir"] is set, every page is also written there (debugging),
+    named after the PDF. `key` only identifies the document to the caller.
+    """
+    pages = []
+    doc = fitz.open(pdf_path)
+    try:
+        for page_index in range(start, stop):
+            page = doc.load_page(page_index)
+            needs_visual = True
+            if triage is not None:
+                needs_visual, text = triage_page(page, **triage)
+            if needs_visual:
+                payload, mime_type = render_page(page, render)
+            else:
+                payload, mime_type = text, TEXT_MIME_TYPE
+            pages.append((page_index + 1, payload, mime_type))
+            if render["keep_dir"]:
+                _keep_page(render["keep_dir"], pdf_path, page_index + 1, payload, mime_type)
+    finally:
+        doc.close()
+    return pages
+
+
+def _keep_page(keep_dir, pdf_path, page_num, payload, mime_type):
+    os.makedirs(keep_dir, exist_ok=True)
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    path = os.path.join(keep_dir, page_file_name(base_name, page_num, mime_type))
+    if mime_type == TEXT_MIME_TYPE:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        with open(path, "wb") as f:
+            f.write(payload)
+
+
+def _render_task(task):
+    return render_page_range(*task)
+
+
+def plan_render_tasks(pdf_jobs, pages_per_task, render=None, triage=None, skip=None, page_counts=None):
+    """
+    Split every (pdf_path, key) job into page ranges of at most
+    pages_per_task pages; `key` identifies the document (the pipeline uses its
+    document id). Tasks come back in document order, then page order.
+    PDFs that cannot be opened are reported and skipped.
+    `skip` maps a key to 1-based page numbers that need no rendering
+    (already captioned); the page count of every opened PDF is stored under
+    its key in the `page_counts` dict when one is given.
+    """
+    render = {**DEFAULT_RENDER, **(render or {})}
+    skip = skip or {}
+    tasks = []
+    for pdf_path, key in pdf_jobs:
+        try:
+            with fitz.open(pdf_path) as doc:
+                page_count = len(doc)
+        except Exception as e:
+            print(f"  ✗ Error opening {os.path.basename(pdf_path)}: {e}")
+            continue
+        if page_counts is not None:
+            page_counts[key] = page_count
+        done = skip.get(key, ())
+        start = 0
+        while start < page_count:
+            if start + 1 in done:
+                start += 1
+                continue
+            # Extend the range over pages still to render, up to pages_per_task
+            stop = start + 1
+            while stop < page_count and stop - start < pages_per_task and stop + 1 not in done:
+                stop += 1
+            tasks.append((pdf_path, key, start, stop, render, triage))
+            start = stop
+    return tasks
+
+
+def iter_render_results(tasks, workers=1):
+    """
+    Run render tasks on a pool of `workers` processes and yield
+    (task, pages, error) as each page range finishes, so later stages can
+    start on the first pages while the rest is still rendering.
+    """
+    if not tasks:
+        return
+    workers = max(1, min(workers, len(tasks)))
+    if workers == 1:
+        for task in tasks:
+            try:
+                yield task, _render_task(task), None
+            except Exception as e:
+                _report_failure(task, e)
+                yield task, [], e
+        return
+
+    # "spawn" keeps the children away from the parent's threads and
+    # loaded models (the pipeline runs inside a web/worker process).
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    try:
+        futures = {executor.submit(_render_task, task): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                yield task, future.result(), None
+            except Exception as e:
+                _report_failure(task, e)
+                yield task, [], e
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def _report_failure(task, error):
+    pdf_path, _, start, stop = task[:4]
+    print(f"  ✗ Error converting {os.path.basename(pdf_path)} pages {start+1}-{stop}: {error}")
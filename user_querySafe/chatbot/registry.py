@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.conf import settings
+
+# ===============================================
+# SHARED MODEL REGISTRY
+# The embedding model and the Vertex AI client are created on first use and
+# then shared by every thread of the process. Processes that never embed or
+# call Gemini (migrate, shell, admin, the scheduler) never load them. With
+# EMBEDDING_SERVICE_SOCKET set, the "model" is a client of the embedding
+# service and no process but the service loads PyTorch.
+
+_instances = {}
+_locks = {}
+
+
+def _get(name, factory):
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+    with _locks.setdefault(name, threading.Lock()):
+        # Another thread may have finished loading while we waited
+        instance = _instances.get(name)
+        if instance is None:
+            start = time.perf_counter()
+            instance = factory()
+            _instances[name] = instance
+            print(f"✓ Loaded {name} in {time.perf_counter() - start:.1f}s")
+    return instance
+
+
+def _create_embedding_engine():
+    if settings.EMBEDDING_SERVICE_SOCKET:
+        from .embedding_service import RemoteEmbeddingEngine
+        return RemoteEmbeddingEngine(
+            settings.EMBEDDING_SERVICE_SOCKET,
+            timeout=settings.EMBEDDING_SERVICE_TIMEOUT,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+        )
+    from .embeddings import EmbeddingEngine
+    return EmbeddingEngine.from_settings()
+
+
+def _create_genai_client():
+    from google import genai
+    return genai.Client(vertexai=True, project=settings.PROJECT_ID, location=settings.REGION)
+
+
+def _create_index_cache():
+    from .index_cache import IndexCache
+    return IndexCache(settings.CHAT_INDEX_CACHE_MAX_MB * 1024 * 1024, mmap=settings.CHAT_INDEX_MMAP)
+
+
+def _create_query_cache():
+    from .embeddings import EMBEDDING_MODEL_NAME
+    from .query_cache import DjangoQueryCache, LocalQueryCache
+    model = f"{EMBEDDING_MODEL_NAME}:{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_ONNX_FILE or ''}"
+    if settings.QUERY_EMBEDDING_CACHE == "django":
+        from django.core.cache import cache
+        return DjangoQueryCache(model, cache, settings.QUERY_EMBEDDING_CACHE_TIMEOUT)
+    if settings.QUERY_EMBEDDING_CACHE != "local":
+        raise ValueError(f"Unknown QUERY_EMBEDDING_CACHE '{settings.QUERY_EMBEDDING_CACHE}', expected 'local' or 'django'")
+    return LocalQueryCache(model, settings.QUERY_EMBEDDING_CACHE_ENTRIES)
+
+
+def _create_answer_cache():
+    from .answer_cache import AnswerCache
+    return AnswerCache(
+        settings.CHAT_ANSWER_CACHE_THRESHOLD,
+        settings.CHAT_ANSWER_CACHE_TTL,
+        settings.CHAT_ANSWER_CACHE_ENTRIES,
+        settings.CHAT_ANSWER_CACHE_CHATBOTS,
+    )
+
+
+def get_embedding_engine():
+    """The process-wide EmbeddingEngine, used by the training pipeline and the chat view."""
+    return _get("embedding engine", _create_embedding_engine)
+
+
+def get_genai_client():
+    """The process-wide Vertex AI client, used for captions and chat answers."""
+    return _get("genai client", _create_genai_client)
+
+
+def get_index_cache():
+    """The process-wide cache of loaded chatbot indexes, used by the chat view."""
+    return _get("index cache", _create_index_cache)
+
+
+def get_query_cache():
+    """The process-wide cache of chat query embeddings, used by the chat view."""
+    return _get("query embedding cache", _create_query_cache)
+
+
+def get_answer_cache():
+    """The process-wide cache of chat answers per chatbot, used by the chat view."""
+    return _get("answer cache", _create_answer_cache)
@@ -0,0 +1,197 @@
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from user_querySafe.models import Chatbot, PipelineJob, UserPlanAlot
+
+# ===============================================
+# GLOBAL PIPELINE SCHEDULER
+# Training runs are queued as PipelineJob rows and started by the dispatcher:
+# - at most PIPELINE_GLOBAL_WORKERS jobs run at once, across all customers
+# - a user never holds more than PIPELINE_MAX_JOBS_PER_TENANT of those slots,
+#   and among waiting users the one served least recently goes first, so one
+#   huge upload cannot starve everybody else
+# - jobs wait in priority lanes taken from the user's plan; a job is promoted
+#   one lane per PIPELINE_PRIORITY_AGING_MINUTES of waiting, so lower lanes
+#   still move while higher ones are busy
+# The dispatcher runs whenever a job is queued or finishes.
+
+DISPATCH_LOCK_KEY = "pipeline-dispatch-lock"
+DISPATCH_PENDING_KEY = "pipeline-dispatch-pending"
+
+
+def plan_priority(user):
+    """Queue lane of a user's active plan (0 without one)."""
+    active_plan = UserPlanAlot.objects.filter(
+        user=user,
+        expire_date__gte=timezone.now().date()
+    ).order_by('-timestamp').first()
+    return active_plan.pipeline_priority if active_plan else 0
+
+
+def enqueue_pipeline_job(chatbot_id):
+    """Queue a training run for a chatbot. Returns False when one is already waiting."""
+    chatbot = Chatbot.objects.select_related('user').get(chatbot_id=chatbot_id)
+    try:
+        with transaction.atomic():
+            PipelineJob.objects.create(chatbot=chatbot, user=chatbot.user, priority=plan_priority(chatbot.user))
+    except IntegrityError:
+        # The waiting job will pick up the new documents as well
+        return False
+    return True
+
+
+def effective_lane(job, now):
+    aging = settings.PIPELINE_PRIORITY_AGING_MINUTES
+    if not aging:
+        return job.priority
+    waited = (now - job.enqueued_at).total_seconds()
+    return job.priority + int(waited // (aging * 60))
+
+
+def pick_next_job(queued, running, last_served, now):
+    """
+    Choose the queued job to start next, or None when every waiting job is
+    blocked (its chatbot is already training or its user is at the cap).
+    Order: highest effective lane, then the user with the fewest running jobs,
+    then the user served least recently, then the oldest job.
+    """
+    running_chatbots = {job.chatbot_id for job in running}
+    running_per_user = Counter(job.user_id for job in running)
+    candidates = [
+        job for job in queued
+        if job.chatbot_id not in running_chatbots
+        and running_per_user[job.user_id] < settings.PIPELINE_MAX_JOBS_PER_TENANT
+    ]
+    if not candidates:
+        return None
+    never = now - timedelta(days=36500)
+    return min(candidates, key=lambda job: (
+        -effective_lane(job, now),
+        running_per_user[job.user_id],
+        last_served.get(job.user_id) or never,
+        job.enqueued_at,
+        job.id,
+    ))
+
+
+def recover_stale_jobs(now):
+    """
+    Requeue running jobs whose worker is gone. A live job beats every
+    PIPELINE_LOCK_TTL / 3 while it runs and at every attempt, so a job silent
+    for a few TTLs plus the longest retry wait lost its worker.
+    """
+    cutoff = now - timedelta(seconds=3 * settings.PIPELINE_LOCK_TTL + settings.PIPELINE_RETRY_BACKOFF_MAX)
+    stale = PipelineJob.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    for job in stale.select_related('chatbot'):
+        print(f"⚠️  Pipeline job {job.id} for chatbot {job.chatbot.chatbot_id} stopped sending heartbeats, requeueing it.")
+        try:
+            with transaction.atomic():
+                PipelineJob.objects.filter(id=job.id).update(status='queued', started_at=None, heartbeat_at=None)
+        except IntegrityError:
+            # A newer job of this chatbot is already waiting and covers its documents
+            PipelineJob.objects.filter(id=job.id).update(status='failed', finished_at=now)
+
+
+def _dispatch_once(start_job):
+    started = []
+    now = timezone.now()
+    recover_stale_jobs(now)
+    while True:
+        running = list(PipelineJob.objects.filter(status='running'))
+        if len(running) >= settings.PIPELINE_GLOBAL_WORKERS:
+            break
+        queued = list(PipelineJob.objects.filter(status='queued').select_related('chatbot'))
+        if not queued:
+            break
+        last_served = dict(
+            PipelineJob.objects.filter(user_id__in={job.user_id for job in queued}, started_at__isnull=False)
+            .values_list('user_id').annotate(last=Max('started_at'))
+        )
+        job = pick_next_job(queued, running, last_served, now)
+        if job is None:
+            break
+        # Claim the job; only one dispatcher can move it out of 'queued'
+        if not PipelineJob.objects.filter(id=job.id, status='queued').update(status='running', started_at=timezone.now()):
+            continue
+        wait = (timezone.now() - job.enqueued_at).total_seconds()
+        print(f"➤ Starting pipeline job {job.id} for chatbot {job.chatbot.chatbot_id} (lane {job.priority}, waited {wait:.0f}s)")
+        try:
+            start_job(job)
+        except Exception:
+            PipelineJob.objects.filter(id=job.id).update(status='queued', started_at=None)
+            raise
+        started.append(job.id)
+        now = timezone.now()
+    return started
+
+
+def dispatch_pipeline_jobs(start_job):
+    """
+    Start queued jobs while the global budget has room; `start_job(job)` hands a
+    claimed job to a worker. Only one dispatcher runs at a time, a call made
+    meanwhile makes it loop once more instead of being lost.
+    Returns the ids of the started jobs.
+    """
+    if not cache.add(DISPATCH_LOCK_KEY, True, 60):
+        cache.set(DISPATCH_PENDING_KEY, True, 60)
+        return []
+    started = []
+    try:
+        while True:
+            cache.delete(DISPATCH_PENDING_KEY)
+            started += _dispatch_once(start_job)
+            if not cache.get(DISPATCH_PENDING_KEY):
+                break
+    finally:
+        cache.delete(DISPATCH_LOCK_KEY)
+    return started
+
+
+def beat_pipeline_job(job_id):
+    """Record that the worker of a running job is alive."""
+    if job_id:
+        PipelineJob.objects.filter(id=job_id, status='running').update(heartbeat_at=timezone.now())
+
+
+def finish_pipeline_job(job_id, status):
+    if job_id:
+        PipelineJob.objects.filter(id=job_id, status='running').update(status=status, finished_at=timezone.now())
+
+
+def queue_metrics(window_seconds=3600):
+    """Queue depth per lane and wait times of the jobs started in the last `window_seconds`."""
+    now = timezone.now()
+    queued = list(PipelineJob.objects.filter(status='queued'))
+    lanes = {}
+    for job in queued:
+        lane = lanes.setdefault(job.priority, {"queued": 0, "oldest_wait_seconds": 0.0})
+        lane["queued"] += 1
+        lane["oldest_wait_seconds"] = max(lane["oldest_wait_seconds"], (now - job.enqueued_at).total_seconds())
+    waits = [
+        job.wait_time for job in PipelineJob.objects.filter(
+            started_at__gte=now - timedelta(seconds=window_seconds)
+        ).only('enqueued_at', 'started_at')
+    ]
+    return {
+        "budget": settings.PIPELINE_GLOBAL_WORKERS,
+        "running": PipelineJob.objects.filter(status='running').count(),
+        "queued": len(queued),
+        "users_waiting": len({job.user_id for job in queued}),
+        "lanes": {str(priority): lanes[priority] for priority in sorted(lanes, reverse=True)},
+        "wait_seconds": {
+            "window_seconds": window_seconds,
+            "started": len(waits),
+            "p50": float(np.percentile(waits, 50)) if waits else None,
+            "p95": float(np.percentile(waits, 95)) if waits else None,
+            "max": max(waits) if waits else None,
+        },
+    }
@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+
+from .chunk_store import ensure_chunk_store
+
+# ===============================================
+# ARTIFACT STORAGE
+# Everything the pipeline derives from a chatbot's uploads lives in one folder
+# per chatbot, so no stage ever lists a folder shared by all tenants:
+#
+#   PIPELINE_ARTIFACT_ROOT/<chatbot_id>/
+#       manifest.json               documents in the index and their chunk ranges
+#       index.faiss                 vector index
+#       chunks.bin                  chunk store (see chunk_store.py)
+#       pages/                      rendered pages (PIPELINE_KEEP_PAGE_IMAGES only)
+#       documents/<document_id>/
+#           captions.txt            full caption text of the document
+#           checkpoints/            page captions of a run in progress
+#
+# Uploaded PDFs are stored by the ChatbotDocument file storage under
+# files_uploaded/<chatbot_id>/.
+
+MANIFEST_VERSION = 1
+
+
+def chatbot_dir(chatbot_id):
+    return os.path.join(settings.PIPELINE_ARTIFACT_ROOT, chatbot_id)
+
+
+def document_dir(chatbot_id, document_id):
+    return os.path.join(chatbot_dir(chatbot_id), "documents", str(document_id))
+
+
+def index_path(chatbot_id):
+    return os.path.join(chatbot_dir(chatbot_id), "index.faiss")
+
+
+def chunks_path(chatbot_id):
+    return os.path.join(chatbot_dir(chatbot_id), "chunks.bin")
+
+
+def manifest_path(chatbot_id):
+    return os.path.join(chatbot_dir(chatbot_id), "manifest.json")
+
+
+def pages_dir(chatbot_id):
+    return os.path.join(chatbot_dir(chatbot_id), "pages")
+
+
+def captions_path(chatbot_id, document_id):
+    return os.path.join(document_dir(chatbot_id, document_id), "captions.txt")
+
+
+def checkpoints_dir(chatbot_id, document_id):
+    return os.path.join(document_dir(chatbot_id, document_id), "checkpoints")
+
+
+def empty_manifest():
+    return {"format": MANIFEST_VERSION, "version": 0, "dimension": None, "vectors": 0, "documents": {}}
+
+
+def read_manifest(chatbot_id):
+    """
+    The chatbot's manifest: the index `version` (bumped on every write), its
+    `dimension` and `vectors`, and per document id its name, page count and
+    [start, stop) range of chunk ids.
+    """
+    try:
+        with open(manifest_path(chatbot_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return empty_manifest()
+
+
+def write_manifest(chatbot_id, manifest):
+    directory = chatbot_dir(chatbot_id)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(chatbot_id))
+
+
+def ensure_chatbot_artifacts(chatbot_id):
+    """
+    Paths (index, chunk store) of a chatbot's trained data, or None when it has
+    none yet. Data of chatbots trained before the per-chatbot layout is moved
+    out of the flat INDEX_DIR / META_DIR folders on first use.
+    """
+    index_file, chunks_file = index_path(chatbot_id), chunks_path(chatbot_id)
+    if os.path.exists(index_file) and os.path.exists(chunks_file):
+        return index_file, chunks_file
+    legacy_index = os.path.join(settings.INDEX_DIR, f"{chatbot_id}-index.index")
+    if not os.path.exists(legacy_index):
+        return None
+    legacy_chunks = ensure_chunk_store(settings.META_DIR, chatbot_id, compress=settings.PIPELINE_CHUNK_COMPRESSION)
+    if not legacy_chunks:
+        return None
+    os.makedirs(chatbot_dir(chatbot_id), exist_ok=True)
+    try:
+        # Chunks first: readers look for the index, which must not appear without them
+        os.replace(legacy_chunks, chunks_file)
+        os.replace(legacy_index, index_file)
+    except FileNotFoundError:
+        # Another process moved them in the meantime
+        if not (os.path.exists(index_file) and os.path.exists(chunks_file)):
+            return None
+    if not os.path.exists(manifest_path(chatbot_id)):
+        write_manifest(chatbot_id, empty_manifest())
+    print(f"  ✓ Moved the index of chatbot {chatbot_id} to {chatbot_dir(chatbot_id)}")
+    return index_file, chunks_file
+
+
+def delete_chatbot_artifacts(chatbot_id):
+    """Remove everything derived from a deleted chatbot's uploads."""
+    shutil.rmtree(chatbot_dir(chatbot_id), ignore_errors=True)
@@ -0,0 +1,131 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a streaming pipeline. `fn(item)` returns an iterable of items
+    for the next stage (possibly empty, e.g. while a document is incomplete).
+    `workers` threads run the stage concurrently.
+    """
+
+    def __init__(self, name, fn, workers=1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+
+
+def chain_sources(*sources):
+    """
+    Like itertools.chain, but closing it also closes every source, so a
+    generator holding resources (e.g. a process pool) is released when
+    run_stages stops early.
+    """
+    try:
+        for source in sources:
+            yield from source
+    finally:
+        for source in sources:
+            if hasattr(source, "close"):
+                source.close()
+
+
+def run_stages(source, stages, queue_size=32):
+    """
+    Run `source` (an iterable, consumed in its own thread) through `stages`,
+    connected by bounded queues so every stage works at the same time and a
+    slow stage applies back-pressure instead of letting items pile up.
+    Returns the items produced by the last stage, in completion order.
+    The first exception raised anywhere stops all stages and is re-raised.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    results = queue.Queue()
+    stop = threading.Event()
+    errors = []
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def produce():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            fail(e)
+        finally:
+            # Release resources held by generator sources (e.g. a process pool)
+            if hasattr(source, "close"):
+                source.close()
+            for _ in range(stages[0].workers):
+                put(queues[0], _DONE)
+
+    def run_stage(position):
+        stage = stages[position]
+        inbox = queues[position]
+        last = position == len(stages) - 1
+        outbox = results if last else queues[position + 1]
+        next_workers = 1 if last else stages[position + 1].workers
+        remaining = [stage.workers]
+        lock = threading.Lock()
+
+        def work():
+            try:
+                while True:
+                    item = get(inbox)
+                    if item is _DONE:
+                        return
+                    for output in stage.fn(item):
+                        if not put(outbox, output):
+                            return
+            except Exception as e:
+                fail(e)
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    finished = remaining[0] == 0
+                # The last worker of a stage tells the next stage that no more items come
+                if finished:
+                    for _ in range(next_workers):
+                        put(outbox, _DONE)
+
+        return [threading.Thread(target=work, name=f"pipeline-{stage.name}-{i}", daemon=True)
+                for i in range(stage.workers)]
+
+    threads = [threading.Thread(target=produce, name="pipeline-source", daemon=True)]
+    for position in range(len(stages)):
+        threads.extend(run_stage(position))
+    for thread in threads:
+        thread.start()
+
+    outputs = []
+    while True:
+        item = get(results)
+        if item is _DONE:
+            break
+        outputs.append(item)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return outputs
@@ -5,6 +5,7 @@ urlpatterns = [
     path('my_chatbots', views.my_chatbots, name='my_chatbots'),
     path('create/', views.create_chatbot, name='create_chatbot'),
     path('chatbot_status/', views.chatbot_status, name='chatbot_status'),
+    path('chatbot_status/stream/', views.chatbot_status_stream, name='chatbot_status_stream'),
     path('chatbot/<int:pk>/', views.chatbot_detail_view, name='chatbot_detail'),
     path('change_status/', views.change_chatbot_status, name='change_chatbot_status'),
 ]
\ No newline at end of file
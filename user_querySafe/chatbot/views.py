@@ -1,13 +1,20 @@
+import asyncio
 import json  # Add this import at the top
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
 from django.utils import timezone
 from django.shortcuts import get_object_or_404, redirect, render
 from user_querySafe.decorators import login_required
 from user_querySafe.forms import ChatbotCreateForm
 from user_querySafe.models import Activity, Chatbot, ChatbotDocument, User, UserPlanAlot
-from .pipeline_processor import run_pipeline_background
+from .progress import bump_status_version, get_progress_many, get_status_version
+from .storage import delete_chatbot_artifacts
 
 
 @login_required
@@ -30,6 +37,8 @@ def my_chatbots(request):
         'chatbots_total': active_plan.no_of_bot if active_plan else 0,
         'chatbots_remaining': (active_plan.no_of_bot - current_chatbots) if active_plan else 0,
         'show_toaster': False,
+        # Server-Sent Events need ASGI, WSGI deployments long-poll the status instead
+        'status_stream': isinstance(request, ASGIRequest),
     }    
     return render(request, 'user_querySafe/my_chatbots.html', context)
 
@@ -63,6 +72,7 @@ def create_chatbot(request):
             chatbot = form.save(commit=False)
             chatbot.user = user
             chatbot.save()
+            bump_status_version(user.user_id)
 
             # Process document uploads
             uploaded_docs = request.FILES.getlist('pdf_files')
@@ -74,19 +84,27 @@ def create_chatbot(request):
                 return redirect('create_chatbot')
 
             successful_uploads = 0
-            for doc in uploaded_docs:
-                if doc.size > allowed_size_bytes:
-                    messages.error(request, f"File '{doc.name}' exceeds the size limit of {active_plan.doc_size_limit} MB.")
-                    continue
+            with transaction.atomic():
+                for doc in uploaded_docs:
+                    if doc.size > allowed_size_bytes:
+                        messages.error(request, f"File '{doc.name}' exceeds the size limit of {active_plan.doc_size_limit} MB.")
+                        continue
 
-                ChatbotDocument.objects.create(chatbot=chatbot, document=doc)
-                successful_uploads += 1
+                    ChatbotDocument.objects.create(chatbot=chatbot, document=doc)
+                    successful_uploads += 1
+
+                # One training run for the whole batch, started after the documents are committed
+                if successful_uploads > 0:
+                    # Imported here: web workers only load the pipeline (PyMuPDF, FAISS) when training starts
+                    from .pipeline_processor import schedule_pipeline
+                    schedule_pipeline(chatbot.chatbot_id)
 
             if successful_uploads > 0:
                 messages.success(request, f"Chatbot '{chatbot.name}' created successfully with {successful_uploads} document(s)!")
                 return redirect('my_chatbots')
             else:
                 messages.error(request, "No documents were uploaded successfully.")
+                delete_chatbot_artifacts(chatbot.chatbot_id)
                 chatbot.delete()
                 return redirect('create_chatbot')
     else:
@@ -117,6 +135,7 @@ def change_chatbot_status(request):
             # Update status
             chatbot.status = new_status
             chatbot.save()
+            bump_status_version(user.user_id)
             
             # Log the activity
             Activity.objects.create(
@@ -141,13 +160,109 @@ def change_chatbot_status(request):
         'error': 'Invalid request method'
     }, status=405)
 
-def chatbot_status(request):
-    if 'user_id' not in request.session:
+def chatbot_status_data(user_id):
+    """Status of every chatbot of a user, with page-level progress of the ones in training."""
+    chatbots = list(Chatbot.objects.filter(user__user_id=user_id).values('chatbot_id', 'status'))
+    progress = get_progress_many([bot['chatbot_id'] for bot in chatbots])
+    for bot in chatbots:
+        bot['progress'] = progress[bot['chatbot_id']] if bot['status'] == 'training' else None
+    return chatbots
+
+def status_etag(user_id, version):
+    return f'"{user_id}-{version}"'
+
+async def chatbot_status(request):
+    """
+    Polling fallback of chatbot_status_stream. The ETag is the user's status
+    version, so a matching If-None-Match gets a 304 from a single cache read.
+    With ?wait=N the request is held up to N seconds (long poll) until
+    something changes; only under ASGI, a WSGI worker would be blocked.
+    """
+    user_id = await request.session.aget('user_id')
+    if not user_id:
         return JsonResponse({'error': 'Unauthorized'}, status=403)
-    user = User.objects.get(user_id=request.session['user_id'])
-    chatbots = Chatbot.objects.filter(user=user)
-    data = [{'chatbot_id': bot.chatbot_id, 'status': bot.status} for bot in chatbots]
-    return JsonResponse(data, safe=False)
+    try:
+        wait = max(0, min(int(request.GET.get('wait', 0)), settings.CHATBOT_STATUS_LONG_POLL_SECONDS))
+    except ValueError:
+        wait = 0
+    if not isinstance(request, ASGIRequest):
+        wait = 0
+    client_etag = request.headers.get('If-None-Match')
+    deadline = time.monotonic() + wait
+    version = await sync_to_async(get_status_version)(user_id)
+    while client_etag == status_etag(user_id, version) and time.monotonic() < deadline:
+        await asyncio.sleep(settings.CHATBOT_STATUS_CHECK_INTERVAL)
+        version = await sync_to_async(get_status_version)(user_id)
+
+    etag = status_etag(user_id, version)
+    if client_etag == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = JsonResponse(await sync_to_async(chatbot_status_data)(user_id), safe=False)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+def status_events(user_id, last_event_id):
+    """
+    The Server-Sent Events of chatbot_status_stream. Yields None whenever the
+    caller should wait CHATBOT_STATUS_CHECK_INTERVAL before the next check.
+    """
+    last_version = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    deadline = time.monotonic() + settings.CHATBOT_STATUS_STREAM_SECONDS
+    last_sent = time.monotonic()
+    yield "retry: 3000\n\n"
+    while time.monotonic() < deadline:
+        version = get_status_version(user_id)
+        if version != last_version:
+            data = chatbot_status_data(user_id)
+            yield f"id: {version}\nevent: status\ndata: {json.dumps(data)}\n\n"
+            last_version = version
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent > 15:
+            # Comment line, keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            last_sent = time.monotonic()
+        yield None
+
+async def chatbot_status_stream(request):
+    """
+    Server-Sent Events stream of the user's chatbot statuses and training
+    progress. A "status" event is sent whenever the user's status version
+    changes; the stream ends after CHATBOT_STATUS_STREAM_SECONDS and the
+    browser's EventSource reconnects (Last-Event-ID skips an unchanged state).
+    Under ASGI the stream is an async iterator; under WSGI it is a sync one
+    that holds a worker thread until it ends, so the dashboard only opens the
+    stream when served through ASGI and long-polls chatbot_status otherwise.
+    """
+    user_id = await request.session.aget('user_id')
+    if not user_id:
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    events = status_events(user_id, request.headers.get('Last-Event-ID'))
+
+    async def asgi_events():
+        # Cache and database reads run in the sync thread, one step at a time
+        end = object()
+        while (event := await sync_to_async(next)(events, end)) is not end:
+            if event is None:
+                await asyncio.sleep(settings.CHATBOT_STATUS_CHECK_INTERVAL)
+            else:
+                yield event
+
+    def wsgi_events():
+        # Django buffers async iterators under WSGI, this one is sent as it goes
+        for event in events:
+            if event is None:
+                time.sleep(settings.CHATBOT_STATUS_CHECK_INTERVAL)
+            else:
+                yield event
+
+    streaming = asgi_events() if isinstance(request, ASGIRequest) else wsgi_events()
+    response = StreamingHttpResponse(streaming, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tell nginx not to buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 def chatbot_detail_view(request, pk):
     if 'user_id' not in request.session:
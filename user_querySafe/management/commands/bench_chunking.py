@@ -0,0 +1,140 @@
+import glob
+import json
+import os
+import random
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from user_querySafe.chatbot.chunking import TokenChunker
+from user_querySafe.chatbot.registry import get_embedding_engine
+
+WORDS = (
+    "policy invoice customer refund warranty account shipping product service support "
+    "contract payment delivery order return period days business email request document"
+).split()
+
+
+def synthetic_document(rng, pages):
+    """Caption text shaped like the pipeline's: page headers, paragraphs, list lines."""
+    text = ""
+    for page in range(1, pages + 1):
+        text += f"\n--- Page: synthetic_page{page}.jpg ---\n"
+        for _ in range(rng.randint(2, 6)):
+            sentences = [" ".join(rng.choices(WORDS, k=rng.randint(6, 24))).capitalize() + "." for _ in range(rng.randint(2, 7))]
+            text += " ".join(sentences) + "\n\n"
+        text += "\n".join(f"- {' '.join(rng.choices(WORDS, k=rng.randint(2, 8)))}" for _ in range(rng.randint(0, 6))) + "\n\n"
+    return text
+
+
+def load_documents(limit, pages):
+    """Caption files of trained documents, topped up with synthetic ones."""
+    documents = []
+    for path in sorted(glob.glob(os.path.join(settings.PIPELINE_ARTIFACT_ROOT, "*", "documents", "*", "captions.txt"))):
+        if len(documents) >= limit:
+            break
+        with open(path, "r", encoding="utf-8") as f:
+            documents.append(f.read())
+    rng = random.Random(0)
+    while len(documents) < limit:
+        documents.append(synthetic_document(rng, pages))
+    return documents
+
+
+def embedded_coverage(chunker, document, chunks, max_tokens):
+    """
+    Share of the document's tokens that end up in an embedding: each chunk
+    only counts up to the model's sequence limit.
+    """
+    covered = np.zeros(len(document) + 1, dtype=bool)
+    cursor, discarded = 0, 0
+    for chunk in chunks:
+        position = document.find(chunk, cursor)
+        if position < 0:
+            position = document.find(chunk)
+        cursor = max(cursor, position)
+        offsets = chunker.token_offsets(chunk)
+        discarded += max(0, len(offsets) - max_tokens)
+        if offsets:
+            covered[position:position + offsets[min(len(offsets), max_tokens) - 1][1]] = True
+    tokens = chunker.token_offsets(document)
+    return sum(1 for start, _ in tokens if covered[start]) / max(1, len(tokens)), discarded
+
+
+class Command(BaseCommand):
+    help = "Compare character chunks with token chunks: chunking time, embed time and how much text gets embedded"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=20, help="Number of caption documents")
+        parser.add_argument("--pages", type=int, default=10, help="Pages per synthetic document")
+        parser.add_argument("--repeat", type=int, default=2, help="Runs per measurement, the best one is kept")
+
+    def handle(self, *args, **options):
+        embedding_engine = get_embedding_engine()
+        tokenizer = embedding_engine.tokenizer
+        if not TokenChunker.supports(tokenizer):
+            raise CommandError("The embedding model has no fast tokenizer, token chunks are not available.")
+        max_tokens = embedding_engine.max_tokens
+        documents = load_documents(options["documents"], options["pages"])
+        repeat = max(1, options["repeat"])
+        splitters = {
+            "characters": RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200),
+            "tokens": TokenChunker(
+                tokenizer,
+                min(settings.PIPELINE_CHUNK_MAX_TOKENS or max_tokens, max_tokens),
+                settings.PIPELINE_CHUNK_OVERLAP_TOKENS,
+            ),
+        }
+        measure = splitters["tokens"]
+        embedding_engine.encode(["warm-up"] * 8)
+
+        report = {
+            "documents": len(documents),
+            "characters": sum(len(document) for document in documents),
+            "max_tokens": max_tokens,
+            "splitters": {},
+        }
+        for name, splitter in splitters.items():
+            best_chunk, best_embed = None, None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                chunks = [[c.strip() for c in splitter.split_text(document) if c.strip()] for document in documents]
+                chunk_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                embedding_engine.encode([chunk for document_chunks in chunks for chunk in document_chunks])
+                embed_seconds = time.perf_counter() - start
+                best_chunk = chunk_seconds if best_chunk is None else min(best_chunk, chunk_seconds)
+                best_embed = embed_seconds if best_embed is None else min(best_embed, embed_seconds)
+
+            coverage, discarded, chunk_tokens = [], 0, []
+            for document, document_chunks in zip(documents, chunks):
+                share, lost = embedded_coverage(measure, document, document_chunks, max_tokens)
+                coverage.append(share)
+                discarded += lost
+                chunk_tokens += [len(measure.token_offsets(chunk)) for chunk in document_chunks]
+            embedded_tokens = sum(min(tokens, max_tokens) for tokens in chunk_tokens)
+            report["splitters"][name] = {
+                "chunks": len(chunk_tokens),
+                "chunk_seconds": round(best_chunk, 3),
+                "embed_seconds": round(best_embed, 3),
+                "tokens_per_chunk_mean": round(float(np.mean(chunk_tokens)), 1) if chunk_tokens else 0,
+                "tokens_per_chunk_max": max(chunk_tokens, default=0),
+                "truncated_chunks": sum(1 for tokens in chunk_tokens if tokens > max_tokens),
+                "tokens_discarded_at_embed": discarded,
+                "embedded_tokens": embedded_tokens,
+                "embed_ms_per_1k_embedded_tokens": round(1000 * best_embed / max(1, embedded_tokens) * 1000, 2),
+                "coverage_min": round(min(coverage), 4),
+                "coverage_mean": round(float(np.mean(coverage)), 4),
+            }
+
+        characters, tokens = report["splitters"]["characters"], report["splitters"]["tokens"]
+        report["tokens_vs_characters"] = {
+            "embed_cost_per_embedded_token": round(
+                tokens["embed_ms_per_1k_embedded_tokens"] / characters["embed_ms_per_1k_embedded_tokens"], 3
+            ) if characters["embed_ms_per_1k_embedded_tokens"] else None,
+            "coverage_gain": round(tokens["coverage_mean"] - characters["coverage_mean"], 4),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
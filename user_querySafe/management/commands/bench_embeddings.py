@@ -0,0 +1,142 @@
+import glob
+import json
+import os
+import random
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user_querySafe.chatbot.chunk_store import ChunkStore
+from user_querySafe.chatbot.embedding_service import RemoteEmbeddingEngine
+from user_querySafe.chatbot.embeddings import EMBEDDING_BACKENDS, EmbeddingEngine, load_embedding_model
+
+WORDS = (
+    "policy invoice customer refund warranty account shipping product service support "
+    "contract payment delivery order return period days business email request document"
+).split()
+
+
+def load_texts(limit):
+    """Chunks from the existing chunk stores, topped up with synthetic text."""
+    texts = []
+    for path in sorted(glob.glob(os.path.join(settings.PIPELINE_ARTIFACT_ROOT, "*", "chunks.bin"))):
+        with ChunkStore(path) as store:
+            texts.extend(store)
+        if len(texts) >= limit:
+            break
+    # Top up with synthetic text of mixed length when there are not enough chunks
+    rng = random.Random(0)
+    while len(texts) < limit:
+        texts.append(" ".join(rng.choices(WORDS, k=rng.randint(5, 180))))
+    return texts[:limit]
+
+
+def timed(fn, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def cosine_agreement(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return float(np.min(np.sum(a * b, axis=1)))
+
+
+def service_latency(queries, clients):
+    """Single-text encodes through the embedding service, with `clients` workers querying at once."""
+    engine = RemoteEmbeddingEngine(settings.EMBEDDING_SERVICE_SOCKET, timeout=settings.EMBEDDING_SERVICE_TIMEOUT)
+    engine.encode(queries[:1])
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        measured = []
+        for query in queries:
+            start = time.perf_counter()
+            engine.encode([query])
+            measured.append(1000 * (time.perf_counter() - start))
+        with lock:
+            latencies.extend(measured)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "queries": len(latencies),
+        "queries_per_sec": round(len(latencies) / seconds, 1),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "max_ms": round(max(latencies), 2),
+        "info": engine.info,
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare embedding throughput of the engine backends against plain SentenceTransformer.encode"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--texts", type=int, default=2000, help="Number of texts to embed")
+        parser.add_argument("--backends", default="torch,torch-int8",
+                            help=f"Comma separated backends out of {', '.join(EMBEDDING_BACKENDS)}")
+        parser.add_argument("--batch-sizes", default="32,64,128", help="Comma separated batch sizes")
+        parser.add_argument("--repeat", type=int, default=2, help="Runs per configuration, the best one is kept")
+        parser.add_argument("--query-runs", type=int, default=200, help="Single-text encodes, as done per chat query")
+        parser.add_argument("--service", action="store_true",
+                            help="Also measure query latency through the embedding service (EMBEDDING_SERVICE_SOCKET)")
+        parser.add_argument("--clients", type=int, default=8, help="Concurrent workers querying the embedding service")
+
+    def handle(self, *args, **options):
+        texts = load_texts(options["texts"])
+        repeat = max(1, options["repeat"])
+        queries = texts[:options["query_runs"]]
+
+        # Current path: one encode() call with default settings in fp32
+        baseline_model = load_embedding_model("torch")
+        baseline_model.encode(texts[:8])  # warm-up
+        baseline_seconds, reference = timed(lambda: np.array(baseline_model.encode(texts)).astype("float32"), repeat)
+        query_seconds, _ = timed(lambda: [baseline_model.encode([q]) for q in queries], 1)
+        report = {
+            "texts": len(texts),
+            "baseline": {
+                "seconds": round(baseline_seconds, 3),
+                "texts_per_sec": round(len(texts) / baseline_seconds, 1),
+                "query_ms": round(1000 * query_seconds / max(1, len(queries)), 2),
+            },
+            "engines": [],
+        }
+
+        for backend in [b.strip() for b in options["backends"].split(",") if b.strip()]:
+            model = baseline_model if backend == "torch" else load_embedding_model(backend, settings.EMBEDDING_ONNX_FILE)
+            for batch_size in [int(b) for b in options["batch_sizes"].split(",")]:
+                engine = EmbeddingEngine(model, batch_size=batch_size)
+                engine.encode(texts[:8])
+                seconds, vectors = timed(lambda: engine.encode(texts), repeat)
+                query_seconds, _ = timed(lambda: [engine.encode([q]) for q in queries], 1)
+                report["engines"].append({
+                    "backend": backend,
+                    "batch_size": batch_size,
+                    "seconds": round(seconds, 3),
+                    "texts_per_sec": round(len(texts) / seconds, 1),
+                    "speedup": round(baseline_seconds / seconds, 2),
+                    "query_ms": round(1000 * query_seconds / max(1, len(queries)), 2),
+                    "min_cosine_vs_baseline": round(cosine_agreement(reference, vectors), 4),
+                })
+
+        if options["service"]:
+            report["service"] = service_latency(queries, max(1, options["clients"]))
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from user_querySafe.chatbot.index_cache import MMAP_FLAGS, read_index
+
+
+def memory_kb():
+    """Resident memory of this process split into heap (anonymous) and mapped file pages, Linux only."""
+    usage = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(("RssAnon:", "RssFile:")):
+                usage[line.split(":")[0]] = int(line.split()[1])
+    return usage
+
+
+def drop_page_cache(path):
+    # Evict the file's pages so the next read really goes to disk (no root needed)
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def percentiles(latencies):
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+def measure(paths, mmap, queries, steady_runs, cold):
+    """Open every index and query it once (first query), then keep querying the open indexes."""
+    before = memory_kb()
+    first, opens, indexes = [], [], []
+    for i, path in enumerate(paths):
+        if cold:
+            drop_page_cache(path)
+        start = time.perf_counter()
+        index = read_index(path, mmap)
+        opened = time.perf_counter()
+        index.search(queries[i % len(queries)][None], 5)
+        first.append(1000 * (time.perf_counter() - start))
+        opens.append(1000 * (opened - start))
+        indexes.append(index)
+    loaded = memory_kb()
+
+    steady = []
+    for run in range(steady_runs):
+        index = indexes[run % len(indexes)]
+        start = time.perf_counter()
+        index.search(queries[run % len(queries)][None], 5)
+        steady.append(1000 * (time.perf_counter() - start))
+    after = memory_kb()
+    return {
+        "open": percentiles(opens),
+        "first_query": percentiles(first),
+        "steady_query": percentiles(steady),
+        "heap_mb_after_first_queries": round((loaded["RssAnon"] - before["RssAnon"]) / 1024, 1),
+        "mapped_file_mb_after_first_queries": round((loaded["RssFile"] - before["RssFile"]) / 1024, 1),
+        "heap_mb_steady": round((after["RssAnon"] - before["RssAnon"]) / 1024, 1),
+        "mapped_file_mb_steady": round((after["RssFile"] - before["RssFile"]) / 1024, 1),
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare faiss.read_index with memory-mapped index loading: first-query latency, steady-state latency, memory"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chatbots", type=int, default=50, help="Number of synthetic chatbot indexes")
+        parser.add_argument("--vectors", type=int, default=5000, help="Vectors per index")
+        parser.add_argument("--dimension", type=int, default=384, help="Vector dimension (all-MiniLM-L6-v2: 384)")
+        parser.add_argument("--queries", type=int, default=2000, help="Steady-state searches over the open indexes")
+        parser.add_argument("--warm", action="store_true",
+                            help="Leave the index files in the page cache before the first query")
+
+    def handle(self, *args, **options):
+        if not os.path.exists("/proc/self/status"):
+            raise CommandError("Memory is read from /proc, run this benchmark on Linux.")
+        if not MMAP_FLAGS:
+            raise CommandError("This FAISS build has no IO_FLAG_MMAP_IFC, indexes cannot be memory-mapped.")
+        rng = np.random.default_rng(0)
+        dimension = options["dimension"]
+        queries = rng.random((256, dimension), dtype="float32")
+        report = {
+            "chatbots": options["chatbots"],
+            "vectors_per_index": options["vectors"],
+            "index_mb_total": round(options["chatbots"] * options["vectors"] * dimension * 4 / (1024 * 1024), 1),
+            "cold_first_query": not options["warm"],
+            "modes": {},
+        }
+        with tempfile.TemporaryDirectory(prefix="bench-index-") as directory:
+            paths = []
+            for i in range(options["chatbots"]):
+                index = faiss.IndexFlatL2(dimension)
+                index.add(rng.random((options["vectors"], dimension), dtype="float32"))
+                paths.append(os.path.join(directory, f"{i}.faiss"))
+                faiss.write_index(index, paths[-1])
+            # Memory-mapped first: heap freed by the other mode would not be returned to the OS
+            for name, mmap in (("mmap", True), ("read_index", False)):
+                report["modes"][name] = measure(paths, mmap, queries, options["queries"], not options["warm"])
+
+        mapped, read = report["modes"]["mmap"], report["modes"]["read_index"]
+        report["mmap_vs_read_index"] = {
+            "first_query_p50": round(mapped["first_query"]["p50_ms"] / read["first_query"]["p50_ms"], 3),
+            "steady_query_p50": round(mapped["steady_query"]["p50_ms"] / read["steady_query"]["p50_ms"], 3),
+            "heap_mb_saved": round(read["heap_mb_steady"] - mapped["heap_mb_steady"], 1),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,162 @@
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import fitz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from user_querySafe.chatbot import pipeline_processor as pp
+from user_querySafe.chatbot.captioning import StubCaptionClient
+from user_querySafe.chatbot.instrumentation import PipelineRecorder
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+WORDS = (
+    "policy invoice customer refund warranty account shipping product service support "
+    "contract payment delivery order return period days business email request document"
+).split()
+
+
+def build_pdf(path, pages, image_ratio, rng):
+    """
+    Write a synthetic PDF. About `image_ratio` of the pages carry a full-page
+    noise image (triaged to captioning), the others only carry text.
+    """
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        if rng.random() < image_ratio:
+            pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 560), False)
+            pix.set_rect(pix.irect, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            for _ in range(40):
+                x, y = rng.randrange(380), rng.randrange(540)
+                pix.set_rect(fitz.IRect(x, y, x + 20, y + 20), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+            page.insert_image(fitz.Rect(40, 40, 555, 802), pixmap=pix)
+        else:
+            text = " ".join(rng.choices(WORDS, k=350))
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=10)
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its (render) child processes."""
+    if resource is None:
+        return None, None
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = "Run the ingestion pipeline on synthetic PDFs with a fake caption client and report throughput as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=4, help="Number of synthetic PDFs")
+        parser.add_argument("--pages", type=int, default=25, help="Pages per PDF")
+        parser.add_argument("--image-ratio", type=float, default=0.5, help="Share of image pages (0-1)")
+        parser.add_argument("--latency", type=float, default=1.0, help="Fixed caption latency in seconds")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Extra random caption latency, up to this many seconds")
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Seed for the synthetic content; reuse one with --caption-cache to measure a warm cache")
+        parser.add_argument("--caption-cache",
+                            help="Caption cache directory kept between runs (default: an empty one per run)")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated PDFs and artifacts")
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        seed = options["seed"] if options["seed"] is not None else random.randrange(1 << 30)
+        rng = random.Random(seed)
+        chatbot_id = f"BENCH{seed % 10000:04d}"
+        # Everything the run writes stays in here, never in the real artifact root or caption cache
+        work_dir = tempfile.mkdtemp(prefix=f"{chatbot_id}-")
+        pdf_dir = os.path.join(work_dir, "pdfs")
+        os.makedirs(pdf_dir)
+        documents = [
+            (i + 1, os.path.join(pdf_dir, f"{chatbot_id}_bench_{i + 1}.pdf"))
+            for i in range(options["documents"])
+        ]
+        for _, pdf_path in documents:
+            build_pdf(pdf_path, options["pages"], options["image_ratio"], rng)
+
+        client = StubCaptionClient(latency=options["latency"], jitter=options["jitter"])
+        recorder = PipelineRecorder()
+        bench_settings = override_settings(
+            PIPELINE_ARTIFACT_ROOT=os.path.join(work_dir, "chatbots"),
+            PIPELINE_CAPTION_CACHE_DIR=options["caption_cache"] or os.path.join(work_dir, "caption_cache"),
+            INDEX_DIR=os.path.join(work_dir, "vector_index"),
+            META_DIR=os.path.join(work_dir, "chunk-metadata"),
+        )
+        # The pipeline keeps its caption cache for the life of the process, use a fresh one
+        caption_cache, pp._caption_cache = pp._caption_cache, None
+        start = time.perf_counter()
+        try:
+            with bench_settings:
+                pp.process_documents(chatbot_id, documents, caption_client=client, recorder=recorder)
+            seconds = time.perf_counter() - start
+        finally:
+            pp._caption_cache = caption_cache
+            if options["keep"]:
+                self.stderr.write(f"PDFs and artifacts kept in {work_dir}")
+            else:
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        pages = recorder.stages["render"].pages if "render" in recorder.stages else 0
+        rss, children_rss = peak_rss_mb()
+        report = {
+            "commit": current_commit(),
+            "config": {
+                "documents": options["documents"],
+                "pages_per_document": options["pages"],
+                "image_ratio": options["image_ratio"],
+                "latency": options["latency"],
+                "jitter": options["jitter"],
+                "seed": seed,
+                "raster_workers": settings.PIPELINE_RASTER_WORKERS,
+                "caption_concurrency": settings.PIPELINE_CAPTION_CONCURRENCY,
+            },
+            "pages": pages,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 2) if seconds else None,
+            "caption_calls": client.calls,
+            "peak_rss_mb": rss,
+            "peak_rss_children_mb": children_rss,
+            "stages": {
+                stats.name: {
+                    "wall_time": round(stats.wall_time, 3),
+                    "busy_time": round(stats.busy_time, 3),
+                    "pages": stats.pages,
+                    "chunks": stats.chunks,
+                    "vectors": stats.vectors,
+                    "bytes_read": stats.bytes_read,
+                    "bytes_written": stats.bytes_written,
+                    "api_calls": stats.api_calls,
+                    "latency_p50_ms": stats.latency_percentile(50),
+                    "latency_p95_ms": stats.latency_percentile(95),
+                    "failures": stats.failures,
+                }
+                for stats in recorder.stages.values()
+            },
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,57 @@
+import os
+import signal
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from user_querySafe.chatbot.embedding_service import EmbeddingServer
+
+
+class Command(BaseCommand):
+    help = "Serve embeddings over a Unix socket to the web and Celery workers of this box (see EMBEDDING_SERVICE_SOCKET)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--socket", default=settings.EMBEDDING_SERVICE_SOCKET, help="Unix socket path to listen on")
+        parser.add_argument("--threads", type=int, default=settings.EMBEDDING_SERVICE_THREADS,
+                            help="Intra-op threads of the model")
+        parser.add_argument("--max-batch", type=int, default=settings.EMBEDDING_BATCH_SIZE,
+                            help="Most texts embedded in one forward pass")
+        parser.add_argument("--batch-wait-ms", type=float, default=settings.EMBEDDING_SERVICE_BATCH_WAIT_MS,
+                            help="How long to wait for more requests to fill a batch")
+
+    def handle(self, *args, **options):
+        socket_path = options["socket"]
+        if not socket_path:
+            raise CommandError("No socket path: pass --socket or set EMBEDDING_SERVICE_SOCKET.")
+        threads = max(1, options["threads"])
+        # Must be set before the model runtime starts its thread pools
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[name] = str(threads)
+        if settings.EMBEDDING_BACKEND.startswith("torch"):
+            import torch
+            torch.set_num_threads(threads)
+            # Requests are already serialized by the batcher
+            torch.set_num_interop_threads(1)
+
+        from user_querySafe.chatbot.embeddings import EmbeddingEngine
+        engine = EmbeddingEngine.from_settings()
+        engine.encode(["warm-up"])
+        server = EmbeddingServer(
+            socket_path,
+            engine,
+            max_batch=options["max_batch"],
+            wait=options["batch_wait_ms"] / 1000,
+            info={"backend": settings.EMBEDDING_BACKEND, "threads": threads},
+        )
+        self.stdout.write(f"✓ Embedding service ({settings.EMBEDDING_BACKEND}, {threads} thread(s)) listening on {socket_path}")
+        # systemd stops the service with SIGTERM; exit through the cleanup below
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
@@ -0,0 +1,21 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from user_querySafe.chatbot.scheduler import queue_metrics
+
+
+class Command(BaseCommand):
+    help = "Print training queue depth per priority lane and recent wait times as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--window", type=int, default=3600, help="Seconds of started jobs to compute wait times over")
+        parser.add_argument("--watch", type=float, default=0, help="Repeat every N seconds")
+
+    def handle(self, *args, **options):
+        while True:
+            self.stdout.write(json.dumps(queue_metrics(options["window"])))
+            if not options["watch"]:
+                return
+            time.sleep(options["watch"])
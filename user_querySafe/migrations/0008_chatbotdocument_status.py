@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+def mark_existing_documents_processed(apps, schema_editor):
+    # Documents uploaded before per-document state existed already went
+    # through the full pipeline, so they must not be embedded a second time.
+    ChatbotDocument = apps.get_model('user_querySafe', 'ChatbotDocument')
+    ChatbotDocument.objects.update(status='processed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_querySafe', '0007_helpsupportrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatbotdocument',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatbotdocument',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('processed', 'Processed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_documents_processed, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-18 10:24
+
+import hashlib
+import os
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    # Fingerprint documents uploaded before hashing existed, so re-uploads of
+    # them are recognised too. Missing files are left without a hash.
+    ChatbotDocument = apps.get_model('user_querySafe', 'ChatbotDocument')
+    upload_dir = os.path.join(settings.BASE_DIR, 'documents', 'files_uploaded')
+    for document in ChatbotDocument.objects.filter(content_hash=''):
+        path = os.path.join(upload_dir, document.document.name)
+        if not os.path.exists(path):
+            continue
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        document.content_hash = digest.hexdigest()
+        document.save(update_fields=['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_querySafe', '0008_chatbotdocument_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatbotdocument',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='chatbotdocument',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='user_querySafe.chatbotdocument'),
+        ),
+        migrations.AlterField(
+            model_name='chatbotdocument',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('processed', 'Processed'), ('failed', 'Failed'), ('duplicate', 'Duplicate')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(backfill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 10:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_querySafe', '0009_chatbotdocument_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('wall_time', models.FloatField(default=0, help_text='Seconds')),
+                ('documents', models.PositiveIntegerField(default=0)),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('vectors', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('chatbot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pipeline_runs', to='user_querySafe.chatbot')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PipelineStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('wall_time', models.FloatField(default=0, help_text='Seconds from first to last activity')),
+                ('busy_time', models.FloatField(default=0, help_text='Seconds of work summed over worker threads')),
+                ('pages', models.PositiveIntegerField(default=0)),
+                ('chunks', models.PositiveIntegerField(default=0)),
+                ('vectors', models.PositiveIntegerField(default=0)),
+                ('bytes_read', models.BigIntegerField(default=0)),
+                ('bytes_written', models.BigIntegerField(default=0)),
+                ('api_calls', models.PositiveIntegerField(default=0)),
+                ('latency_p50', models.FloatField(blank=True, help_text='Milliseconds', null=True)),
+                ('latency_p95', models.FloatField(blank=True, help_text='Milliseconds', null=True)),
+                ('latency_p99', models.FloatField(blank=True, help_text='Milliseconds', null=True)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='user_querySafe.pipelinerun')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 10:46
+
+import django.core.files.storage
+import user_querySafe.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user_querySafe', '0011_pipelinejob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chatbotdocument',
+            name='document',
+            field=models.FileField(storage=django.core.files.storage.FileSystemStorage(location='C:\\Users\\Dipanshu Saini\\Desktop\\Metric Vibes\\Metric Vibes Tools\\Vertex AI\\AskVibes\\QuerySafe v0-2\\documents\\files_uploaded'), upload_to=user_querySafe.models.chatbot_document_upload_to),
+        ),
+    ]
@@ -2,16 +2,21 @@ from django.db import models
 import random
 import string
 import os
+import hashlib
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
 from django.utils.text import get_valid_filename
-from user_querySafe.chatbot.pipeline_processor import run_pipeline_background
 from django.contrib.auth import get_user_model
 User = get_user_model()
 
 # Create a custom storage that points to BASE_DIR/documents/files_uploaded
 custom_storage = FileSystemStorage(location=os.path.join(settings.BASE_DIR, 'documents', 'files_uploaded'))
 
+
+def chatbot_document_upload_to(instance, filename):
+    # One folder per chatbot, so no upload ever lands in a folder shared by all tenants
+    return os.path.join(instance.chatbot.chatbot_id, filename)
+
 class User(models.Model):
     STATUS_CHOICES = (
         ('registered', 'Registered'),
@@ -130,35 +135,176 @@ class Chatbot(models.Model):
         return self.name
 
 class ChatbotDocument(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+        ('duplicate', 'Duplicate'),
+    )
+
     chatbot = models.ForeignKey('Chatbot', on_delete=models.CASCADE)
-    # Use custom_storage so that files are saved in BASE_DIR/documents/files_uploaded
-    document = models.FileField(upload_to='', storage=custom_storage)
+    # Use custom_storage so that files are saved in BASE_DIR/documents/files_uploaded/<chatbot_id>
+    document = models.FileField(upload_to=chatbot_document_upload_to, storage=custom_storage)
+    # Training state of this document; the pipeline only picks up pending documents
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    processed_at = models.DateTimeField(null=True, blank=True)
+    # SHA-256 of the uploaded bytes, used to detect re-uploads of the same file
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    # Set when the same bytes were already uploaded to this chatbot; the duplicate
+    # shares the original's file and artifacts instead of being processed again
+    duplicate_of = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates'
+    )
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return str(self.document.name) if hasattr(self.document, 'name') else "No document"
 
+    @staticmethod
+    def compute_content_hash(uploaded_file):
+        # Uploads coming through our upload handlers are hashed while streaming
+        content_hash = getattr(uploaded_file, 'sha256', None)
+        if content_hash:
+            return content_hash
+        digest = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+        uploaded_file.seek(0)
+        return digest.hexdigest()
+
     def save(self, *args, **kwargs):
         # If new and file is uploaded, rename the file before saving
-        if not self.pk and self.document:
-            pdf_file = self.document
+        if not self.pk and self.document and not self.document._committed:
+            pdf_file = self.document.file
             chatbot_id = self.chatbot.chatbot_id
-            original_filename = get_valid_filename(pdf_file.name)
-            file_extension = os.path.splitext(original_filename)[1]
+            self.content_hash = self.compute_content_hash(pdf_file)
+
+            original = ChatbotDocument.objects.filter(
+                chatbot=self.chatbot,
+                content_hash=self.content_hash,
+                duplicate_of__isnull=True,
+            ).exclude(status='failed').order_by('id').first()
+
+            if original:
+                # Same bytes already uploaded to this chatbot: link to them, store nothing
+                self.document.name = original.document.name
+                self.document._committed = True
+                self.duplicate_of = original
+                self.status = 'duplicate'
+                print(f"♻️  Duplicate upload linked to: {original.document.name}")
+            else:
+                original_filename = get_valid_filename(pdf_file.name)
+                file_extension = os.path.splitext(original_filename)[1]
+
+                # Truncate the original filename if it's too long
+                max_filename_length = 200
+                if len(original_filename) > max_filename_length:
+                    original_filename = original_filename[:max_filename_length - len(file_extension)]
+
+                filename = f"{chatbot_id}_{original_filename}{file_extension}"
+                # Save file using custom storage (this writes to BASE_DIR/documents/files_uploaded/<chatbot_id>)
+                # FieldFile.save marks the file committed, so the model save does not store it twice
+                self.document.save(filename, pdf_file, save=False)
+                print(f"✅ File uploaded: {self.document.name}")
+
+        # Training is not started here: the view (or admin) that stores a batch
+        # of documents schedules one pipeline run via schedule_pipeline()
+        super().save(*args, **kwargs)
 
-            # Truncate the original filename if it's too long
-            max_filename_length = 200
-            if len(original_filename) > max_filename_length:
-                original_filename = original_filename[:max_filename_length - len(file_extension)]
+class PipelineJob(models.Model):
+    """A queued or running training run, scheduled by chatbot/scheduler.py."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
 
-            filename = f"{chatbot_id}_{original_filename}{file_extension}"
-            # Save file using custom storage (this writes to BASE_DIR/documents/files_uploaded)
-            saved_name = self.document.storage.save(filename, pdf_file)
-            self.document.name = saved_name
-            print(f"✅ File uploaded: {filename}")
+    chatbot = models.ForeignKey('Chatbot', on_delete=models.CASCADE, related_name='pipeline_jobs')
+    # The tenant: jobs are shared fairly between users
+    user = models.ForeignKey('User', on_delete=models.CASCADE, related_name='pipeline_jobs')
+    # Lane from the user's plan at enqueue time, higher runs first
+    priority = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    enqueued_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Last sign of life of the worker running the job, see recover_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
 
-        super().save(*args, **kwargs)
-        run_pipeline_background(self.chatbot.chatbot_id)
+    class Meta:
+        ordering = ['-enqueued_at']
+        indexes = [models.Index(fields=['status', 'priority'])]
+        constraints = [
+            # A queued job picks up every pending document, one per chatbot is enough
+            models.UniqueConstraint(
+                fields=['chatbot'],
+                condition=models.Q(status='queued'),
+                name='one_queued_pipeline_job_per_chatbot',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.chatbot.chatbot_id} job {self.id} ({self.status})"
+
+    @property
+    def wait_time(self):
+        """Seconds between enqueueing and starting, None while still queued."""
+        if self.started_at is None:
+            return None
+        return (self.started_at - self.enqueued_at).total_seconds()
+
+class PipelineRun(models.Model):
+    STATUS_CHOICES = (
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    )
+
+    chatbot = models.ForeignKey('Chatbot', on_delete=models.CASCADE, related_name='pipeline_runs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    wall_time = models.FloatField(default=0, help_text="Seconds")
+    documents = models.PositiveIntegerField(default=0)
+    pages = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    vectors = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.chatbot.chatbot_id} run {self.id} ({self.status})"
+
+class PipelineStage(models.Model):
+    run = models.ForeignKey(PipelineRun, on_delete=models.CASCADE, related_name='stages')
+    name = models.CharField(max_length=50)
+    # Stages overlap, so wall times of a run's stages add up to more than the run
+    wall_time = models.FloatField(default=0, help_text="Seconds from first to last activity")
+    busy_time = models.FloatField(default=0, help_text="Seconds of work summed over worker threads")
+    pages = models.PositiveIntegerField(default=0)
+    chunks = models.PositiveIntegerField(default=0)
+    vectors = models.PositiveIntegerField(default=0)
+    bytes_read = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    api_calls = models.PositiveIntegerField(default=0)
+    latency_p50 = models.FloatField(null=True, blank=True, help_text="Milliseconds")
+    latency_p95 = models.FloatField(null=True, blank=True, help_text="Milliseconds")
+    latency_p99 = models.FloatField(null=True, blank=True, help_text="Milliseconds")
+    failures = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.name} ({self.wall_time:.1f}s)"
 
 class Conversation(models.Model):
     conversation_id = models.CharField(max_length=10, unique=True, editable=False)
@@ -253,6 +399,8 @@ class SubscriptionPlan(models.Model):
         ('personal', 'Personal'),
     )
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='public')
+    # Training queue lane of this plan's users, higher lanes are served first
+    pipeline_priority = models.PositiveSmallIntegerField(default=0)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -278,6 +426,8 @@ class UserPlanAlot(models.Model):
     no_of_docs = models.PositiveIntegerField()
     doc_size_limit = models.PositiveIntegerField(help_text="Document size limit in MB")
     expire_date = models.DateField()
+    # Copied from SubscriptionPlan.pipeline_priority when the plan is allotted
+    pipeline_priority = models.PositiveSmallIntegerField(default=0)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -75,7 +75,8 @@ def plan_activation_view(request, plan_id):
                         no_query=plan.no_query_per_bot,
                         no_of_docs=plan.no_of_docs_per_bot,
                         doc_size_limit=plan.size_limit_per_docs,
-                        expire_date=expire_date
+                        expire_date=expire_date,
+                        pipeline_priority=plan.pipeline_priority
                     )
                     
                     # Update activation code usage
@@ -0,0 +1,100 @@
+import threading
+from contextlib import contextmanager
+
+from celery import Task, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from user_querySafe.chatbot.pipeline_processor import (
+    mark_pipeline_failed,
+    pipeline_lock_key,
+    process_pipeline,
+)
+from user_querySafe.chatbot.scheduler import beat_pipeline_job, dispatch_pipeline_jobs, finish_pipeline_job
+
+
+@contextmanager
+def hold_pipeline_lock(lock_key, owner, job_id=None):
+    """
+    Keep refreshing a run lock taken with PIPELINE_LOCK_TTL (and the heartbeat
+    of the scheduler job) while the block runs, then release it. A worker that
+    is killed stops refreshing, so its lock expires after PIPELINE_LOCK_TTL
+    instead of blocking the chatbot, and the scheduler requeues its job.
+    """
+    stop = threading.Event()
+
+    def heartbeat():
+        try:
+            while not stop.wait(settings.PIPELINE_LOCK_TTL / 3):
+                if cache.get(lock_key) == owner:
+                    cache.touch(lock_key, settings.PIPELINE_LOCK_TTL)
+                try:
+                    beat_pipeline_job(job_id)
+                except Exception as e:
+                    print(f"⚠️  Could not record the heartbeat of pipeline job {job_id}: {e}")
+        finally:
+            # This thread's own database connection
+            connection.close()
+
+    thread = threading.Thread(target=heartbeat, name=f"pipeline-lock-{owner}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        release_pipeline_lock(lock_key, owner)
+
+
+def release_pipeline_lock(lock_key, owner):
+    # Never release a lock another run took after ours expired
+    if cache.get(lock_key) == owner:
+        cache.delete(lock_key)
+
+
+class PipelineTask(Task):
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        # Called once all retries are used up
+        release_pipeline_lock(pipeline_lock_key(args[0]), task_id)
+        mark_pipeline_failed(args[0])
+        job_id = args[1] if len(args) > 1 else kwargs.get('job_id')
+        finish_pipeline_job(job_id, 'failed')
+        dispatch_pipeline.delay()
+
+
+@shared_task(ignore_result=True)
+def dispatch_pipeline():
+    """Start queued training jobs while the global worker budget has room."""
+    dispatch_pipeline_jobs(lambda job: run_chatbot_pipeline.delay(job.chatbot.chatbot_id, job.id))
+
+
+@shared_task(
+    bind=True,
+    base=PipelineTask,
+    acks_late=True,
+    autoretry_for=(Exception,),
+    max_retries=settings.PIPELINE_MAX_RETRIES,
+    retry_backoff=30,
+    retry_backoff_max=settings.PIPELINE_RETRY_BACKOFF_MAX,
+)
+def run_chatbot_pipeline(self, chatbot_id, job_id=None):
+    """
+    Durable training job for one chatbot, started by the scheduler. Only one
+    run per chatbot executes at a time; a job that finds another run active
+    waits and retries. The job keeps its scheduler slot while retrying.
+    """
+    lock_key = pipeline_lock_key(chatbot_id)
+    owner = self.request.id or f"inline-{threading.get_ident()}"
+    # Beat at every attempt, so a job waiting for its next retry is not taken for lost
+    beat_pipeline_job(job_id)
+    # A redelivered job (its worker was killed mid-run) takes back the lock it left behind
+    if not cache.add(lock_key, owner, settings.PIPELINE_LOCK_TTL):
+        if cache.get(lock_key) != owner:
+            raise self.retry(countdown=30, max_retries=None)
+        cache.set(lock_key, owner, settings.PIPELINE_LOCK_TTL)
+    with hold_pipeline_lock(lock_key, owner, job_id):
+        process_pipeline(chatbot_id)
+    finish_pipeline_job(job_id, 'done')
+    # A slot is free again
+    dispatch_pipeline.delay()
@@ -5,10 +5,6 @@ from .models import ActivationCode, Activity, Contact, User, Chatbot, ChatbotDoc
 from django.http import JsonResponse
 import json
 from django.views.decorators.csrf import csrf_exempt
-import os
-import faiss
-from sentence_transformers import SentenceTransformer
-from google import genai
 from django.conf import settings
 from django.views.decorators.clickjacking import xframe_options_exempt
 from django.views.decorators.http import require_POST
@@ -20,13 +16,12 @@ from django.core.mail import send_mail
 import random
 from django.template.loader import render_to_string
 from .decorators import redirect_authenticated_user, login_required
+from .chatbot.registry import get_answer_cache, get_embedding_engine, get_genai_client, get_index_cache, get_query_cache
 from django.views.decorators.http import require_http_methods
 from django.core.cache import cache
 from django.urls import reverse
 
-# Initialize models and clients
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-client = genai.Client(vertexai=True, project=settings.PROJECT_ID, location=settings.REGION)
+# The embedding model and the Vertex AI client are loaded on first use (chatbot/registry.py)
 
 def generate_otp():
     return ''.join([str(random.randint(0, 9)) for _ in range(6)])
@@ -514,30 +509,37 @@ def chat_message(request):
             for msg in reversed(chat_history)
         ])
         
-        # Get vector search results
-        index_path = os.path.join(settings.INDEX_DIR, f"{chatbot_id}-index.index")
-        meta_path = os.path.join(settings.META_DIR, f"{chatbot_id}-chunks.json")
+        # Get vector search results; hot chatbots stay loaded in this worker
+        loaded = get_index_cache().get(chatbot_id)
         
-        if not os.path.exists(index_path) or not os.path.exists(meta_path):
+        if loaded is None:
             return JsonResponse({'error': 'Chatbot data not found'}, status=404)
         
-        index = faiss.read_index(index_path)
-        with open(meta_path, 'r', encoding='utf-8') as f:
-            chunks = json.load(f)
-        
-        query_vector = embedding_model.encode([user_message]).astype('float32')
+        # Repeated questions reuse their vector instead of running the model again
+        query_vector = get_query_cache().encode(user_message, get_embedding_engine)
         k = 5
-        distances, indices = index.search(query_vector, k)
+        distances, indices = loaded.index.search(query_vector, k)
         
+        # Only the k matched chunks are read from the memory-mapped store
         matches = []
+        chunks = loaded.chunks
         for i, idx in enumerate(indices[0]):
-            if idx < len(chunks):
+            if 0 <= idx < len(chunks):
                 matches.append({
                     'content': chunks[idx],
                     'distance': float(distances[0][i])
                 })
         
         knowledge_context = "\n\n".join([m['content'] for m in matches])
+
+        # A first question carries no history, so its answer only depends on the question
+        # and the retrieved chunks: a near-duplicate of an earlier one can reuse its answer.
+        # Later questions may lean on the conversation ("and the second one?") and are never cached.
+        answer_cache = get_answer_cache() if len(chat_history) == 1 else None
+        chunk_ids = [int(idx) for idx in indices[0] if 0 <= idx < len(chunks)]
+        bot_response = None
+        if answer_cache is not None:
+            bot_response = answer_cache.get(chatbot_id, loaded.signature, query_vector, chunk_ids)
         
         # Build prompt with both chat history and knowledge context
         prompt = f"""Previous conversation:
@@ -560,13 +562,16 @@ Remember to:
 8. 
 """
         
-        # Get response from Gemini
-        gemini_response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=[{"role": "user", "parts": [{"text": prompt}]}]
-        )
-        
-        bot_response = gemini_response.text
+        # Get response from Gemini, unless a cached answer fits
+        if bot_response is None:
+            gemini_response = get_genai_client().models.generate_content(
+                model="gemini-2.0-flash-001",
+                contents=[{"role": "user", "parts": [{"text": prompt}]}]
+            )
+            
+            bot_response = gemini_response.text
+            if answer_cache is not None and bot_response:
+                answer_cache.put(chatbot_id, loaded.signature, query_vector, chunk_ids, bot_response)
         
         # Store bot response
         Message.objects.create(